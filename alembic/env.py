@@ -6,13 +6,15 @@ from dotenv import load_dotenv
 
 from sqlalchemy import create_engine
 from sqlalchemy import pool
+from sqlalchemy.engine import make_url
 
 from alembic import context
 
 from sqlmodel import SQLModel
 
-# 載入 .env 檔案中的環境變數
-load_dotenv()
+# 載入 .env 檔案中的環境變數 (生產環境 ENV=production 時由部署環境直接提供)
+if os.getenv("ENV") != "production":
+    load_dotenv()
 
 # ===========================================================================
 # IMPORTANT: 從環境變數獲取資料庫 URL
@@ -23,6 +25,11 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL not set")
 
+# 應用程式使用非同步驅動程式 (asyncpg / aiosqlite)，遷移則維持使用同步驅動程式 (psycopg2 / pysqlite)
+SYNC_DRIVERS = {"postgresql+asyncpg": "postgresql+psycopg2", "sqlite+aiosqlite": "sqlite"}
+_url = make_url(DATABASE_URL)
+DATABASE_URL = _url.set(drivername=SYNC_DRIVERS.get(_url.drivername, _url.drivername)).render_as_string(hide_password=False)
+
 config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
@@ -30,16 +37,26 @@ if config.config_file_name is not None:
 import app.models  # noqa: F401
 target_metadata = SQLModel.metadata
 
+def include_object(object, name, type_, reflected, compare_to):
+    """autogenerate 略過限定其他資料庫的索引 (Index.ddl_if)，例如在 SQLite 上不比對 PostgreSQL 的 pg_trgm 索引。"""
+    ddl_if = getattr(object, "_ddl_if", None)
+    if type_ == "index" and ddl_if is not None and ddl_if.dialect:
+        return context.get_context().dialect.name == ddl_if.dialect
+    return True
+
 def run_migrations_offline():
     context.configure(url=DATABASE_URL, target_metadata=target_metadata,
-                      literal_binds=True, dialect_opts={"paramstyle": "named"})
+                      literal_binds=True, dialect_opts={"paramstyle": "named"},
+                      compare_server_default=True, include_object=include_object)
     with context.begin_transaction():
         context.run_migrations()
 
 def run_migrations_online():
     connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(connection=connection, target_metadata=target_metadata,
+                          compare_server_default=True, # autogenerate 一併比對欄位的 server_default
+                          include_object=include_object)
         with context.begin_transaction():
             context.run_migrations()
 
@@ -0,0 +1,65 @@
+"""初始資料表：product、warehouse_item、movement
+
+對應專案最初以 SQLModel.metadata.create_all 建立的資料表結構，後續的結構變更皆以獨立的遷移接續。
+已以該結構建立的既有資料庫，請先執行 alembic stamp 0001_initial，再執行 alembic upgrade head。
+
+Revision ID: 0001_initial
+Revises:
+Create Date: 2026-10-14
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001_initial"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "product",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.Column("description", sa.String(length=500), nullable=True),
+        sa.Column("sku", sa.String(length=50), nullable=False),
+        sa.Column("price", sa.Numeric(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_product_name", "product", ["name"])
+    op.create_index("ix_product_sku", "product", ["sku"], unique=True)
+
+    op.create_table(
+        "warehouse_item",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("location", sa.String(length=100), nullable=False),
+        sa.Column("safety_stock", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_warehouse_item_product_id", "warehouse_item", ["product_id"])
+    op.create_index("ix_warehouse_item_location", "warehouse_item", ["location"])
+
+    op.create_table(
+        "movement",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), sa.ForeignKey("product.id"), nullable=False),
+        sa.Column("warehouse_item_id", sa.Integer(), sa.ForeignKey("warehouse_item.id"), nullable=True),
+        sa.Column("movement_type", sa.Enum("IN", "OUT", name="movementtype"), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=False),
+        sa.Column("movement_date", sa.DateTime(), nullable=False),
+        sa.Column("remarks", sa.String(length=500), nullable=True),
+    )
+    op.create_index("ix_movement_product_id", "movement", ["product_id"])
+    op.create_index("ix_movement_warehouse_item_id", "movement", ["warehouse_item_id"])
+    op.create_index("ix_movement_movement_type", "movement", ["movement_type"])
+
+def downgrade():
+    op.drop_table("movement")
+    op.drop_table("warehouse_item")
+    op.drop_table("product")
+    if op.get_context().dialect.name == "postgresql":
+        op.execute("DROP TYPE IF EXISTS movementtype") # PostgreSQL 的 ENUM 型別不會隨資料表一併刪除
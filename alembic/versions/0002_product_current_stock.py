@@ -0,0 +1,29 @@
+"""product.current_stock：所有位置庫存量的反正規化欄位
+
+新增 product.current_stock，並以 warehouse_item 既有的庫存量回填。
+
+Revision ID: 0002_product_current_stock
+Revises: 0001_initial
+Create Date: 2026-10-14
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_product_current_stock"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("product", sa.Column("current_stock", sa.Integer(), server_default="0", nullable=False))
+
+    # 回填：以各位置庫存量的總和作為產品的目前庫存
+    op.execute(
+        "UPDATE product SET current_stock = ("
+        "SELECT COALESCE(SUM(quantity), 0) FROM warehouse_item WHERE warehouse_item.product_id = product.id)"
+    )
+
+def downgrade():
+    with op.batch_alter_table("product") as batch_op: # SQLite 不支援直接刪除欄位，以批次模式重建表格
+        batch_op.drop_column("current_stock")
@@ -0,0 +1,49 @@
+"""時間戳由資料庫設定：created_at、updated_at 與 movement_date 改為帶時區並預設 now()
+
+應用程式不再自行產生時間戳，新增資料時依賴欄位的 server_default。
+既有的時間戳為 datetime.utcnow 產生的 UTC 時間，PostgreSQL 轉換型別時以 UTC 解讀。
+
+Revision ID: 0003_timestamp_server_defaults
+Revises: 0002_product_current_stock
+Create Date: 2026-10-14
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_timestamp_server_defaults"
+down_revision = "0002_product_current_stock"
+branch_labels = None
+depends_on = None
+
+TIMESTAMP_COLUMNS = {
+    "product": ["created_at", "updated_at"],
+    "warehouse_item": ["created_at", "updated_at"],
+    "movement": ["movement_date"],
+}
+
+def upgrade():
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op: # SQLite 不支援 ALTER COLUMN，以批次模式重建表格
+            for column in columns:
+                batch_op.alter_column(
+                    column,
+                    type_=sa.DateTime(timezone=True),
+                    existing_type=sa.DateTime(),
+                    server_default=sa.func.now(),
+                    existing_nullable=False,
+                    postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+                )
+
+def downgrade():
+    for table, columns in TIMESTAMP_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for column in columns:
+                batch_op.alter_column(
+                    column,
+                    type_=sa.DateTime(),
+                    existing_type=sa.DateTime(timezone=True),
+                    server_default=None,
+                    existing_nullable=False,
+                    postgresql_using=f"{column} AT TIME ZONE 'UTC'",
+                )
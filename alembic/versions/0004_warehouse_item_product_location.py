@@ -0,0 +1,49 @@
+"""warehouse_item 複合索引：(product_id, location) 唯一、(product_id, quantity)
+
+入庫以 INSERT ... ON CONFLICT (product_id, location) 累加數量，需要 (product_id, location) 的唯一索引。
+建立唯一索引前先合併重複的 (product_id, location) 庫存項目：保留 ID 最小的一筆，
+數量與安全庫存量加總至該筆 (總庫存與低庫存判斷不變)，出入庫記錄改為指向保留的項目，再刪除其餘重複項目。
+合併無法還原，downgrade 只移除索引。
+
+Revision ID: 0004_warehouse_item_product_location
+Revises: 0003_timestamp_server_defaults
+Create Date: 2026-10-14
+"""
+
+from alembic import op
+
+revision = "0004_warehouse_item_product_location"
+down_revision = "0003_timestamp_server_defaults"
+branch_labels = None
+depends_on = None
+
+# 每個 (product_id, location) 保留的庫存項目
+KEPT_IDS = "SELECT MIN(id) FROM warehouse_item GROUP BY product_id, location"
+
+def upgrade():
+    # 1. 將重複項目的數量與安全庫存量加總至保留的項目
+    op.execute(
+        "UPDATE warehouse_item SET "
+        "quantity = (SELECT SUM(w.quantity) FROM warehouse_item w "
+        "WHERE w.product_id = warehouse_item.product_id AND w.location = warehouse_item.location), "
+        "safety_stock = (SELECT SUM(w.safety_stock) FROM warehouse_item w "
+        "WHERE w.product_id = warehouse_item.product_id AND w.location = warehouse_item.location) "
+        f"WHERE id IN ({KEPT_IDS} HAVING COUNT(*) > 1)"
+    )
+    # 2. 出入庫記錄改為指向保留的項目
+    op.execute(
+        "UPDATE movement SET warehouse_item_id = ("
+        "SELECT MIN(k.id) FROM warehouse_item k JOIN warehouse_item d "
+        "ON k.product_id = d.product_id AND k.location = d.location "
+        "WHERE d.id = movement.warehouse_item_id) "
+        f"WHERE warehouse_item_id NOT IN ({KEPT_IDS})"
+    )
+    # 3. 刪除其餘重複項目
+    op.execute(f"DELETE FROM warehouse_item WHERE id NOT IN ({KEPT_IDS})")
+
+    op.create_index("ix_wi_product_location", "warehouse_item", ["product_id", "location"], unique=True)
+    op.create_index("ix_wi_product_qty", "warehouse_item", ["product_id", "quantity"])
+
+def downgrade():
+    op.drop_index("ix_wi_product_qty", table_name="warehouse_item")
+    op.drop_index("ix_wi_product_location", table_name="warehouse_item")
@@ -0,0 +1,34 @@
+"""pg_trgm GIN 索引：商品名稱與庫存位置的模糊查詢 (僅限 PostgreSQL)
+
+ILIKE '%x%' 無法使用一般 B-tree 索引，PostgreSQL 改以 pg_trgm 的 GIN 索引支援；其他資料庫略過此遷移。
+
+Revision ID: 0005_trgm_indexes
+Revises: 0004_warehouse_item_product_location
+Create Date: 2026-10-14
+"""
+
+from alembic import op
+
+revision = "0005_trgm_indexes"
+down_revision = "0004_warehouse_item_product_location"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_product_name_trgm", "product", ["name"],
+        postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_wi_location_trgm", "warehouse_item", ["location"],
+        postgresql_using="gin", postgresql_ops={"location": "gin_trgm_ops"},
+    )
+
+def downgrade():
+    if op.get_context().dialect.name != "postgresql":
+        return
+    op.drop_index("ix_wi_location_trgm", table_name="warehouse_item")
+    op.drop_index("ix_product_name_trgm", table_name="product")
@@ -0,0 +1,27 @@
+"""以 product_id 開頭的複合索引取代單欄的 product_id 索引
+
+movement 新增 (product_id, movement_date) 複合索引 ix_mov_product_date，涵蓋依產品 (與日期) 的查詢，移除 ix_movement_product_id。
+warehouse_item 的 product_id 已由 ix_wi_product_location 與 ix_wi_product_qty 涵蓋 (見 0004)，移除 ix_warehouse_item_product_id。
+兩者皆減少每次寫入需維護的索引數量。
+
+Revision ID: 0006_product_id_composite_indexes
+Revises: 0005_trgm_indexes
+Create Date: 2026-10-14
+"""
+
+from alembic import op
+
+revision = "0006_product_id_composite_indexes"
+down_revision = "0005_trgm_indexes"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index("ix_mov_product_date", "movement", ["product_id", "movement_date"])
+    op.drop_index("ix_movement_product_id", table_name="movement")
+    op.drop_index("ix_warehouse_item_product_id", table_name="warehouse_item")
+
+def downgrade():
+    op.create_index("ix_warehouse_item_product_id", "warehouse_item", ["product_id"])
+    op.create_index("ix_movement_product_id", "movement", ["product_id"])
+    op.drop_index("ix_mov_product_date", table_name="movement")
@@ -1,85 +1,179 @@
 # app/api/v1/endpoints/products.py: 產品相關 API 端點定義
 # 這個檔案定義了處理產品的 FastAPI 路由，包括 CRUD 操作。
 # 使用自定義例外處理錯誤，以確保一致性。
+# 讀取端點使用 Redis 快取 (若有設定 REDIS_URL)，寫入端點在提交後使快取失效。
+# Redis 發生錯誤時僅記錄警告並改查資料庫，快取故障不影響 API 的可用性。
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from typing import List, Optional
-from sqlmodel import Session, select
-from datetime import datetime
+from sqlmodel import select, insert
+from sqlalchemy import bindparam, exists
+from sqlmodel.ext.asyncio.session import AsyncSession
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+import hashlib
+import logging
 
-from app.database import get_session
+from app.database import get_session, redis_client
 from app.models import Product
-from app.schemas import ProductCreate, ProductRead, ProductUpdate
+from app.schemas import ProductCreate, ProductRead, ProductUpdate, SkuQuery
 from app.exceptions import ProductNotFoundException
+from app.middleware import etag_matches
 
 router = APIRouter(tags=["Products"], prefix="/products")
+logger = logging.getLogger("warehouse_system_api")
+
+PRODUCT_CACHE_TTL = 300 # 單一產品快取秒數
+PRODUCT_LIST_CACHE_TTL = 30 # 產品列表快取秒數
+PRODUCT_LIST_VERSION_KEY = "products:list:ver" # 產品列表快取版本號，寫入時遞增使舊列表快取失效
+PRODUCT_CACHE_CONTROL = "public, max-age=60" # 單一產品的 HTTP 快取指示
+
+# 模組載入時預先建立固定的查詢語句，每次請求只需綁定參數
+# SKU 唯一性檢查只需布林結果，以 EXISTS 查詢避免取回並建立完整的 ORM 物件
+SKU_EXISTS_STMT = select(exists().where(Product.sku == bindparam("sku")))
+SKU_EXISTS_EXCLUDING_ID_STMT = select(exists().where(
+    Product.sku == bindparam("sku"),
+    Product.id != bindparam("product_id")
+))
+
+# 模組載入時預先建立列表序列化器，列表端點直接輸出 JSON bytes，略過 FastAPI 逐欄位的回應驗證
+PRODUCTS_ADAPTER = TypeAdapter(List[ProductRead])
+
+def _product_cache_key(product_id: int) -> str:
+    return f"product:{product_id}"
+
+def _payload_etag(payload: bytes) -> str:
+    """以序列化後的回應內容計算 ETag：任何欄位變更都會改變 ETag，不受時間戳精度影響。"""
+    return '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
+
+async def _cache_get(key: str) -> Optional[bytes]:
+    """讀取快取；未設定 Redis 或 Redis 無法使用時返回 None，由呼叫端改查資料庫。"""
+    if redis_client is None:
+        return None
+    try:
+        return await redis_client.get(key)
+    except RedisError:
+        logger.warning("讀取快取 %s 失敗，改由資料庫查詢", key, exc_info=True)
+        return None
+
+async def _cache_set(key: str, payload: bytes, ttl: int):
+    """寫入快取；Redis 無法使用時略過，回應照常返回。"""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.set(key, payload, ex=ttl)
+    except RedisError:
+        logger.warning("寫入快取 %s 失敗", key, exc_info=True)
+
+async def _product_list_cache_key(offset: int, limit: int, name: Optional[str], sku: Optional[str]) -> Optional[str]:
+    """組合列表快取鍵 (含目前的列表版本號)；無法取得版本號時返回 None，本次請求不使用列表快取。"""
+    if redis_client is None:
+        return None
+    try:
+        version = await redis_client.get(PRODUCT_LIST_VERSION_KEY) or b"0"
+    except RedisError:
+        logger.warning("讀取產品列表快取版本失敗，改由資料庫查詢", exc_info=True)
+        return None
+    digest = hashlib.blake2b(repr((offset, limit, name, sku)).encode(), digest_size=16).hexdigest()
+    return f"products:list:{version.decode()}:{digest}"
+
+async def _invalidate_product_cache(product_id: int):
+    """刪除單一產品快取，並遞增列表版本號讓所有列表快取自動失效。Redis 無法使用時略過，舊快取最遲於 TTL 後過期。"""
+    if redis_client is None:
+        return
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.delete(_product_cache_key(product_id))
+            pipe.incr(PRODUCT_LIST_VERSION_KEY)
+            await pipe.execute()
+    except RedisError:
+        logger.warning("使產品 %s 的快取失效失敗", product_id, exc_info=True)
 
 @router.post("/", response_model=ProductRead, status_code=status.HTTP_201_CREATED)
-async def create_product(*, session: Session = Depends(get_session), product: ProductCreate):
-    """創建產品：檢查 SKU 唯一性，並將 SKU 轉為大寫儲存。"""
-    with session.begin():
-        existing_product = session.exec(select(Product).where(Product.sku == product.sku.upper())).first()
-        if existing_product:
+async def create_product(*, session: AsyncSession = Depends(get_session), product: ProductCreate):
+    """創建產品：檢查 SKU 唯一性 (SKU 已由 schema 轉為大寫)。"""
+    async with session.begin():
+        if await session.scalar(SKU_EXISTS_STMT, params={"sku": product.sku}):
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"SKU '{product.sku}' 已存在")
 
         product_dict = product.model_dump()
-        product_dict['sku'] = product_dict['sku'].upper()
-        db_product = Product(**product_dict)
-        session.add(db_product)
+        # INSERT ... RETURNING 直接帶回完整的產品資料 (含 ID 與時間戳)，無需在提交後再次查詢
+        db_product = (await session.exec(insert(Product).values(**product_dict).returning(Product))).scalar_one()
 
-    session.refresh(db_product)
+    await _invalidate_product_cache(db_product.id)
     return db_product
 
 @router.get("/", response_model=List[ProductRead])
-async def get_all_products(*, session: Session = Depends(get_session), offset: int = 0, limit: int = 100, name: Optional[str] = None, sku: Optional[str] = None):
-    """獲取所有產品列表：支援分頁、名稱和 SKU 過濾，SKU 查詢轉為大寫處理。"""
+async def get_all_products(*, session: AsyncSession = Depends(get_session), offset: int = 0, limit: int = 100, name: Optional[str] = None, sku: SkuQuery = None):
+    """獲取所有產品列表：支援分頁、名稱和 SKU 過濾 (SKU 查詢參數解析時即轉為大寫)。結果會短暫快取。"""
+    cache_key = await _product_list_cache_key(offset, limit, name, sku)
+    if cache_key is not None:
+        cached = await _cache_get(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+
     query = select(Product)
     if name:
         query = query.where(Product.name.ilike(f"%{name}%"))
     if sku:
-        query = query.where(Product.sku == sku.upper())
-    products = session.exec(query.offset(offset).limit(limit)).all()
-    return products
+        query = query.where(Product.sku == sku)
+    products = (await session.exec(query.offset(offset).limit(limit))).all()
+
+    payload = PRODUCTS_ADAPTER.dump_json(PRODUCTS_ADAPTER.validate_python(products, from_attributes=True))
+    if cache_key is not None:
+        await _cache_set(cache_key, payload, PRODUCT_LIST_CACHE_TTL)
+    return Response(content=payload, media_type="application/json")
 
 @router.get("/{product_id}", response_model=ProductRead)
-async def get_product(*, session: Session = Depends(get_session), product_id: int):
-    """獲取單一產品：根據 ID 查詢，如果不存在則拋出自定義 ProductNotFoundException。"""
-    product = session.get(Product, product_id)
-    if not product:
-        raise ProductNotFoundException()
-    return product
+async def get_product(*, session: AsyncSession = Depends(get_session), request: Request, product_id: int):
+    """
+    獲取單一產品：根據 ID 查詢，如果不存在則拋出自定義 ProductNotFoundException。結果會快取。
+    回應附帶以內容計算的 ETag，客戶端以 If-None-Match 帶回相同 ETag 時直接返回 304，無需再次傳輸內容。
+    """
+    payload = await _cache_get(_product_cache_key(product_id))
+    if payload is None:
+        product = await session.get(Product, product_id)
+        if not product:
+            raise ProductNotFoundException()
+        payload = ProductRead.model_validate(product).model_dump_json().encode()
+        await _cache_set(_product_cache_key(product_id), payload, PRODUCT_CACHE_TTL)
+
+    headers = {"Cache-Control": PRODUCT_CACHE_CONTROL, "ETag": _payload_etag(payload)}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
 
 @router.patch("/{product_id}", response_model=ProductRead)
-async def update_product(*, session: Session = Depends(get_session), product_id: int, product: ProductUpdate):
-    """更新產品：檢查新 SKU 的唯一性，並更新時間戳。如果不存在則拋出自定義例外。"""
-    with session.begin():
-        db_product = session.get(Product, product_id)
+async def update_product(*, session: AsyncSession = Depends(get_session), product_id: int, product: ProductUpdate):
+    """更新產品：檢查新 SKU 的唯一性，時間戳由資料庫自動更新。如果不存在則拋出自定義例外。"""
+    async with session.begin():
+        db_product = await session.get(Product, product_id)
         if not db_product:
             raise ProductNotFoundException()
 
-        if product.sku and product.sku.upper() != db_product.sku:
-            existing_product_with_new_sku = session.exec(select(Product).where(Product.sku == product.sku.upper(), Product.id != product_id)).first()
-            if existing_product_with_new_sku:
+        if product.sku and product.sku != db_product.sku:
+            if await session.scalar(
+                SKU_EXISTS_EXCLUDING_ID_STMT, params={"sku": product.sku, "product_id": product_id}
+            ):
                 raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"新的 SKU '{product.sku}' 已被其他商品使用。")
 
         product_data = product.model_dump(exclude_unset=True)
-        if 'sku' in product_data:
-            product_data['sku'] = product_data['sku'].upper()
         for key, value in product_data.items():
             setattr(db_product, key, value)
-        db_product.updated_at = datetime.utcnow()
 
         session.add(db_product)
 
-    session.refresh(db_product)
+    await _invalidate_product_cache(product_id)
     return db_product
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_product(*, session: Session = Depends(get_session), product_id: int):
+async def delete_product(*, session: AsyncSession = Depends(get_session), product_id: int):
     """刪除產品：根據 ID 刪除，如果不存在則拋出自定義例外。"""
-    with session.begin():
-        product = session.get(Product, product_id)
+    async with session.begin():
+        product = await session.get(Product, product_id)
         if not product:
             raise ProductNotFoundException()
 
-        session.delete(product)
\ No newline at end of file
+        await session.delete(product)
+
+    await _invalidate_product_cache(product_id)
@@ -2,87 +2,136 @@
 # 這個檔案定義了處理庫存項目的 FastAPI 路由，包括入庫、出庫、查詢等操作。
 # 業務邏輯已抽象到 services/inventory_service.py 以提高可維護性。
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List, Optional
-from sqlmodel import Session, select, func
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import List, Optional, Set, Union
+from sqlalchemy import bindparam, exists
+from sqlalchemy.orm import noload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from pydantic import TypeAdapter
 
 from app.database import get_session
-from app.services.inventory_service import stock_in, stock_out, get_low_stock_alerts, get_inventory_overview
+from app.models import WarehouseItem
+from app.services import inventory_service
 from app.schemas import (
-    WarehouseItemCreate, WarehouseItemRead, WarehouseItemUpdate,
-    StockInRequest, StockOutRequest, LowStockAlert, InventoryQueryRead
+    WarehouseItemCreate, WarehouseItemRead, WarehouseItemSummaryRead, WarehouseItemUpdate,
+    StockInRequest, BulkStockInRequest, StockOutRequest, LowStockAlert, InventoryQueryRead, SkuQuery
 )
 
 router = APIRouter(tags=["Warehouse Items"], prefix="/warehouse-items")
 
+# 列表序列化器 (作法同 products.PRODUCTS_ADAPTER)
+WAREHOUSE_ITEMS_ADAPTER = TypeAdapter(List[WarehouseItemRead])
+WAREHOUSE_ITEM_SUMMARIES_ADAPTER = TypeAdapter(List[WarehouseItemSummaryRead]) # 不含關聯產品的精簡列表
+INVENTORY_OVERVIEW_ADAPTER = TypeAdapter(List[InventoryQueryRead])
+LOW_STOCK_ALERTS_ADAPTER = TypeAdapter(List[LowStockAlert])
+
+# 同一產品在同一位置僅能有一筆庫存 (ix_wi_product_location)，變更位置前檢查是否已被該產品的其他項目使用
+LOCATION_EXISTS_EXCLUDING_ID_STMT = select(exists().where(
+    WarehouseItem.product_id == bindparam("item_product_id"),
+    WarehouseItem.location == bindparam("item_location"),
+    WarehouseItem.id != bindparam("item_id")
+))
+
 @router.post("/", response_model=WarehouseItemRead, status_code=status.HTTP_201_CREATED)
-async def create_warehouse_item(*, session: Session = Depends(get_session), item_request: StockInRequest):
+async def create_warehouse_item(*, session: AsyncSession = Depends(get_session), item_request: StockInRequest):
     """入庫操作：根據請求新增或更新庫存項目，並記錄 Movement。"""
-    return stock_in(session, item_request)
+    return await inventory_service.stock_in(session, item_request)
+
+@router.post("/bulk", response_model=List[WarehouseItemRead], status_code=status.HTTP_201_CREATED)
+async def bulk_create_warehouse_items(*, session: AsyncSession = Depends(get_session), bulk_request: BulkStockInRequest):
+    """批次入庫操作：以單一事務新增或更新多筆庫存項目，並記錄每筆 Movement。"""
+    items = await inventory_service.bulk_stock_in(session, bulk_request)
+    payload = WAREHOUSE_ITEMS_ADAPTER.dump_json(WAREHOUSE_ITEMS_ADAPTER.validate_python(items, from_attributes=True))
+    return Response(content=payload, media_type="application/json", status_code=status.HTTP_201_CREATED)
 
 @router.post("/stock-out", response_model=WarehouseItemRead)
-async def perform_stock_out(*, session: Session = Depends(get_session), stock_out_request: StockOutRequest):
+async def perform_stock_out(*, session: AsyncSession = Depends(get_session), stock_out_request: StockOutRequest):
     """出庫操作：根據請求扣減庫存，並記錄 Movement。如果未指定位置，會從多個位置分散扣減。"""
-    return stock_out(session, stock_out_request)
-
-@router.get("/", response_model=List[WarehouseItemRead])
-async def get_all_warehouse_items(*, session: Session = Depends(get_session), offset: int = 0, limit: int = 100, product_id: Optional[int] = None, location: Optional[str] = None):
-    """獲取所有庫存項目列表：支援分頁、產品 ID 和位置過濾。"""
+    return await inventory_service.stock_out(session, stock_out_request)
+
+@router.get("/", response_model=List[Union[WarehouseItemRead, WarehouseItemSummaryRead]]) # 略過 product 時返回精簡格式
+async def get_all_warehouse_items(
+    *,
+    session: AsyncSession = Depends(get_session),
+    offset: int = 0,
+    limit: int = 100,
+    product_id: Optional[int] = None,
+    location: Optional[str] = None,
+    expand: Set[str] = Query({"product"}, description="要一併載入的關聯，傳入 expand= (空值) 則略過載入 product"),
+):
+    """
+    獲取所有庫存項目列表：支援分頁、產品 ID 和位置過濾。
+    關聯的 product 預設以 selectin 一次載入；不需要時可透過 expand 略過，省去額外的查詢與序列化。
+    """
     query = select(WarehouseItem).offset(offset).limit(limit)
+    adapter = WAREHOUSE_ITEMS_ADAPTER
+    if "product" not in expand:
+        query = query.options(noload(WarehouseItem.product))
+        adapter = WAREHOUSE_ITEM_SUMMARIES_ADAPTER
     if product_id:
         query = query.where(WarehouseItem.product_id == product_id)
     if location:
         query = query.where(WarehouseItem.location.ilike(f"%{location}%"))
 
-    items = session.exec(query).all()
-    return items
+    items = (await session.exec(query)).all()
+    payload = adapter.dump_json(adapter.validate_python(items, from_attributes=True))
+    return Response(content=payload, media_type="application/json")
 
 @router.get("/{item_id}", response_model=WarehouseItemRead)
-async def get_warehouse_item(*, session: Session = Depends(get_session), item_id: int):
+async def get_warehouse_item(*, session: AsyncSession = Depends(get_session), item_id: int):
     """獲取單一庫存項目：根據 ID 查詢，如果不存在則拋出 404 錯誤。"""
-    item = session.get(WarehouseItem, item_id)
+    item = await session.get(WarehouseItem, item_id)
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="庫存項目不存在")
     return item
 
 @router.patch("/{item_id}", response_model=WarehouseItemRead)
-async def update_warehouse_item(*, session: Session = Depends(get_session), item_id: int, item: WarehouseItemUpdate):
-    """更新庫存項目：支援更新位置或安全庫存，但數量調整需透過入/出庫接口。如果不存在則拋出 404 錯誤。"""
-    with session.begin():
-        db_item = session.get(WarehouseItem, item_id)
+async def update_warehouse_item(*, session: AsyncSession = Depends(get_session), item_id: int, item: WarehouseItemUpdate):
+    """更新庫存項目：支援更新位置或安全庫存，但數量調整需透過入/出庫接口。如果不存在則拋出 404 錯誤，位置已被同一產品使用則拋出 409 錯誤。"""
+    async with session.begin():
+        db_item = await session.get(WarehouseItem, item_id)
         if not db_item:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="庫存項目不存在")
 
         if item.quantity is not None and item.quantity != db_item.quantity:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="請使用入庫或出庫接口調整數量。")
 
+        if item.location and item.location != db_item.location:
+            if await session.scalar(
+                LOCATION_EXISTS_EXCLUDING_ID_STMT,
+                params={"item_product_id": db_item.product_id, "item_location": item.location, "item_id": item_id}
+            ):
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"該商品在位置 '{item.location}' 已有庫存項目。")
+
         item_data = item.model_dump(exclude_unset=True)
         for key, value in item_data.items():
             setattr(db_item, key, value)
-        db_item.updated_at = datetime.utcnow()
 
         session.add(db_item)
 
-    session.refresh(db_item)
     return db_item
 
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_warehouse_item(*, session: Session = Depends(get_session), item_id: int):
+async def delete_warehouse_item(*, session: AsyncSession = Depends(get_session), item_id: int):
     """刪除庫存項目：根據 ID 刪除，如果不存在則拋出 404 錯誤。"""
-    with session.begin():
-        item = session.get(WarehouseItem, item_id)
+    async with session.begin():
+        item = await session.get(WarehouseItem, item_id)
         if not item:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="庫存項目不存在")
 
-        session.delete(item)
+        await inventory_service.adjust_current_stock(session, {item.product_id: -item.quantity}) # 同步商品的總庫存量
+        await session.delete(item)
 
 @router.get("/inventory/overview", response_model=List[InventoryQueryRead])
-async def get_inventory_overview(*, session: Session = Depends(get_session), offset: int = 0, limit: int = 100, product_name: Optional[str] = None, sku: Optional[str] = None):
+async def get_inventory_overview(*, session: AsyncSession = Depends(get_session), offset: int = 0, limit: int = 100, product_name: Optional[str] = None, sku: SkuQuery = None):
     """獲取庫存概覽：按產品彙總總數量和位置細節，支援分頁和過濾。"""
-    return get_inventory_overview(session, offset, limit, product_name, sku)
+    overview = await inventory_service.get_inventory_overview(session, offset, limit, product_name, sku)
+    # 服務層已回傳驗證過的 schema 物件，直接序列化即可
+    return Response(content=INVENTORY_OVERVIEW_ADAPTER.dump_json(overview), media_type="application/json")
 
 @router.get("/inventory/low-stock", response_model=List[LowStockAlert])
-async def get_low_stock_alerts(*, session: Session = Depends(get_session)):
+async def get_low_stock_alerts(*, session: AsyncSession = Depends(get_session)):
     """獲取低庫存警報：返回總庫存低於安全庫存的產品清單，包括位置細節。"""
-    return get_low_stock_alerts(session)
\ No newline at end of file
+    alerts = await inventory_service.get_low_stock_alerts(session)
+    return Response(content=LOW_STOCK_ALERTS_ADAPTER.dump_json(alerts), media_type="application/json")
\ No newline at end of file
@@ -0,0 +1,35 @@
+# app/config.py: 應用程式設定
+# 環境變數在首次呼叫 get_settings() 時解析一次並快取，各處讀取設定時無需重複呼叫 os.getenv。
+
+import os
+from functools import lru_cache
+from typing import Optional
+
+from pydantic import SecretStr
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from dotenv import load_dotenv
+
+# 非生產環境從 .env 載入環境變數 (只在首次匯入時執行一次)；
+# 生產環境 (ENV=production，與日誌設定共用同一個環境變數) 由 Docker / systemd 等直接提供環境變數，略過 .env 的搜尋與解析
+# 此判斷須在建立 Settings 之前完成，因此直接讀取環境變數 (與 Settings.env 為同一個 ENV)
+if os.getenv("ENV") != "production":
+    load_dotenv()
+
+class Settings(BaseSettings):
+    """應用程式設定，欄位名稱對應同名 (不區分大小寫) 的環境變數。"""
+    env: str = "development" # 執行環境，production 時不讀取 .env、輸出 JSON 日誌且不寫日誌檔案
+    log_level: str = "INFO" # 應用程式日誌級別
+    database_url: Optional[str] = None # 非同步驅動的資料庫連線字串 (必填，於 app.database 檢查)
+    db_pool_size: int = 10 # 每個 worker 的連線池常駐連線數
+    db_max_overflow: int = 10 # 每個 worker 的連線池尖峰時允許額外建立的連線數
+    redis_url: Optional[str] = None # Redis 快取連線字串，未設定則停用快取
+    create_tables_on_startup: bool = False # 啟動時是否自動創建資料庫表格 (僅限開發/測試)
+    app_secret_key: Optional[SecretStr] = None # 應用程式的秘密金鑰
+    example_var: str = "Not Set"
+    sql_echo: bool = False # 是否打印所有執行的 SQL 語句
+
+    model_config = SettingsConfigDict(extra="ignore")
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
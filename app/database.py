@@ -1,24 +1,63 @@
 # app/database.py：處理資料庫連線和 Session 管理
 
-from sqlmodel import create_engine, Session, SQLModel
-from dotenv import load_dotenv
-import os
-from typing import Generator
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from redis.asyncio import Redis
+from app.config import get_settings
+from typing import AsyncGenerator, Optional
 
-load_dotenv()
+settings = get_settings()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# 使用非同步驅動程式，例如 "postgresql+asyncpg://..." 或 "sqlite+aiosqlite:///..."
+DATABASE_URL = settings.database_url
 if not DATABASE_URL:
     raise ValueError("環境變數 'DATABASE_URL' 未設定。請檢查 .env 檔案或環境配置。")
 
-SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+SQL_ECHO = settings.sql_echo
 
-engine = create_engine(DATABASE_URL, echo=SQL_ECHO)
+# 連線池設定：可透過環境變數依容器的預期並行量調整
+# 建議 DB_POOL_SIZE + DB_MAX_OVERFLOW ≥ 每個 worker 預期同時處理的請求數，
+# 且 (DB_POOL_SIZE + DB_MAX_OVERFLOW) × worker 數量 × 容器數量 不超過資料庫的 max_connections
+DB_POOL_SIZE = settings.db_pool_size # 常駐連線數
+DB_MAX_OVERFLOW = settings.db_max_overflow # 尖峰時允許額外建立的連線數
 
-def create_db_and_tables():
+def _pool_options(url: str) -> dict:
+    """
+    回傳連線池參數。
+    記憶體內的 SQLite 使用 StaticPool (所有請求共用同一連線)，不接受連線池大小相關參數，故保留方言預設。
+    """
+    database_url = make_url(url)
+    if database_url.get_backend_name() == "sqlite" and database_url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": 30, # 等待可用連線的秒數，逾時則拋出錯誤而非無限等待
+        "pool_recycle": 1800, # 連線使用 30 分鐘後重建，避免被資料庫或防火牆閒置斷線
+    }
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=SQL_ECHO,
+    pool_pre_ping=True, # 取用連線前先檢查，自動丟棄失效連線
+    **_pool_options(DATABASE_URL),
+)
+
+# expire_on_commit=False：提交後物件屬性仍為最新值，寫入端點無需 refresh 即可直接返回，
+# 也避免在非同步環境中觸發隱式的延遲載入 (資料庫產生的欄位值由模型的 eager_defaults 以 RETURNING 取回)
+async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+# Redis 快取 (可選)：未設定 REDIS_URL 時停用快取，所有讀取直接查詢資料庫
+REDIS_URL = settings.redis_url
+redis_client: Optional[Redis] = Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+async def create_db_and_tables():
     import app.models # noqa: F401
-    SQLModel.metadata.create_all(engine)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
-def get_session() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session() as session:
         yield session
@@ -1,18 +1,76 @@
 # app/logging_config.py: 應用程式日誌配置
 
+import atexit
+import copy
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Optional
+
+import orjson
+
+from app.config import get_settings
+
+# 背景執行緒的日誌監聽器：實際的控制台/文件 I/O 皆在此執行緒中完成
+_queue_listener: Optional[QueueListener] = None
+
+class JSONFormatter(logging.Formatter):
+    """
+    生產環境使用的精簡 JSON 格式器 (orjson)。
+    直接使用記錄建立時的 timestamp，不呼叫 time.strftime，也不輸出檔名與行號。
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        log_entry = {
+            "ts": record.created,
+            "lvl": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_entry["exc"] = record.exc_text # 例外的 traceback 以獨立欄位輸出
+        return orjson.dumps(log_entry).decode()
+
+class _TracebackQueueHandler(QueueHandler):
+    """
+    放入佇列前將例外轉為文字並保留在 exc_text，而非併入訊息本身。
+    預設的 QueueHandler.prepare 會把 traceback 格式化進 msg 並清除 exc_info，
+    使監聽器端的格式器無法再將例外分開輸出 (例如 JSON 的 exc 欄位)。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None # traceback 物件不跨執行緒保留
+        return record
+
+def _stop_queue_listener():
+    """停止日誌監聽器，並將佇列中尚未輸出的日誌寫出。"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
 
 def setup_logging():
     """
     配置應用程式的日誌系統。
     - 日誌將輸出到控制台和文件（僅限本地開發）。
     - 文件日誌將啟用輪換，防止文件過大。
-    - 日誌級別可通過環境變數配置。
+    - 日誌級別與 SQL 日誌可通過環境變數 (LOG_LEVEL、SQL_ECHO，經 get_settings() 讀取) 配置。
     - 在容器化環境中，建議主要輸出到 stdout/stderr。
+    - 日誌器只將記錄放入佇列，由背景執行緒的 QueueListener 負責寫出，避免請求處理時阻塞於 I/O。
+    - 生產環境 (ENV=production) 以 orjson 輸出 JSON 結構化日誌。
     """
-    log_level = os.getenv("LOG_LEVEL", "INFO").upper()
+    global _queue_listener
+    settings = get_settings()
+
+    log_level = settings.log_level.upper()
     numeric_level = getattr(logging, log_level, logging.INFO)
 
     # 確保日誌目錄存在（但在 Docker 中避免寫入檔案，除非使用 volume）
@@ -25,25 +83,34 @@ def setup_logging():
     app_logger.setLevel(numeric_level)
     app_logger.propagate = False # 防止日誌事件被傳播到根日誌器
 
-    # 清除現有的處理器，避免重複
-    if app_logger.handlers:
-        for handler in app_logger.handlers:
-            app_logger.removeHandler(handler)
+    # 配置 SQLAlchemy 的日誌，可通過 SQL_ECHO 環境變數控制
+    sqlalchemy_logger = logging.getLogger("sqlalchemy.engine")
+    sqlalchemy_logger.setLevel(logging.INFO if settings.sql_echo else logging.WARNING) # SQL_ECHO true 時顯示 INFO
+    sqlalchemy_logger.propagate = False
+
+    # 清除現有的處理器，避免重複（重複呼叫時先停止舊的監聽器）
+    _stop_queue_listener()
+    for logger in (app_logger, sqlalchemy_logger):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
 
-    # 格式器
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s (%(filename)s:%(lineno)d)"
-    )
+    # 格式器：生產環境輸出 JSON 結構化日誌，其他環境保留易讀格式
+    if settings.env == "production":
+        formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s (%(filename)s:%(lineno)d)"
+        )
 
     # 控制台處理器（主要輸出）
     console_handler = logging.StreamHandler()
     console_handler.setLevel(numeric_level)
     console_handler.setFormatter(formatter)
-    app_logger.addHandler(console_handler)
+    handlers = [console_handler]
 
     # 文件處理器 (帶有輪換功能，僅限本地開發)
     # 注意：在 Docker 容器中，建議避免寫入檔案或使用 volume 持久化
-    if os.getenv("ENV") != "production":  # 假設有 ENV 變數，生產環境不寫檔案
+    if settings.env != "production":  # 生產環境不寫檔案
         file_handler = RotatingFileHandler(
             log_file_path,
             maxBytes=10 * 1024 * 1024, # 10 MB
@@ -51,13 +118,16 @@ def setup_logging():
         )
         file_handler.setLevel(numeric_level)
         file_handler.setFormatter(formatter)
-        app_logger.addHandler(file_handler)
+        handlers.append(file_handler)
 
-    # 配置 SQLAlchemy 的日誌，可通過 SQL_ECHO 環境變數控制
-    sql_echo = os.getenv("SQL_ECHO", "false").lower() == "true"
-    sqlalchemy_logger = logging.getLogger("sqlalchemy.engine")
-    sqlalchemy_logger.setLevel(logging.INFO if sql_echo else logging.WARNING) # SQL_ECHO true 時顯示 INFO
-    sqlalchemy_logger.addHandler(console_handler) # 也輸出到控制台
-    if os.getenv("ENV") != "production":
-        sqlalchemy_logger.addHandler(file_handler) # 也輸出到文件
-    sqlalchemy_logger.propagate = False
+    # 應用程式與 SQLAlchemy 日誌器只掛載 QueueHandler，將記錄放入佇列即返回
+    log_queue = queue.SimpleQueue()
+    queue_handler = _TracebackQueueHandler(log_queue)
+    app_logger.addHandler(queue_handler)
+    sqlalchemy_logger.addHandler(queue_handler)
+
+    # 啟動背景監聽器，將佇列中的記錄交給實際的處理器輸出
+    _queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+atexit.register(_stop_queue_listener) # 程式結束時停止監聽器，確保日誌完整寫出
@@ -0,0 +1,51 @@
+# app/middleware.py: 應用程式中介軟體
+
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.base import BaseHTTPMiddleware
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    比對 If-None-Match 與目前的 ETag。
+    支援以逗號分隔的多個 ETag 與 "*"，並採弱比對 (忽略 W/ 前綴，例如經壓縮代理轉換過的 ETag)。
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(","))
+
+class ETagMiddleware(BaseHTTPMiddleware):
+    """
+    為 GET 200 回應加上以回應內容計算的 ETag。
+    客戶端以 If-None-Match 帶回相同 ETag 時直接返回 304，省去重複傳輸回應內容。
+    端點已自行設定 ETag 的回應 (例如單一產品) 以及 Cache-Control: no-store 的回應 (例如 /config) 直接略過，不再讀取 body。
+    """
+
+    async def dispatch(self, request: Request, call_next) -> Response:
+        response = await call_next(request)
+        if (
+            request.method != "GET"
+            or response.status_code != status.HTTP_200_OK
+            or "etag" in response.headers
+            or "no-store" in response.headers.get("cache-control", "").lower()
+        ):
+            return response
+
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        headers = MutableHeaders(raw=list(response.raw_headers)) # 以原始標頭複製，保留重複的標頭 (例如多個 Set-Cookie)
+        headers["etag"] = etag
+
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            del headers["content-length"]
+            del headers["content-type"]
+            new_response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        else:
+            new_response = Response(content=body, status_code=response.status_code)
+        new_response.raw_headers = headers.raw
+        return new_response
@@ -8,7 +8,7 @@ from enum import Enum
 from decimal import Decimal
 
 from sqlmodel import Field, SQLModel, Relationship
-from sqlalchemy import Numeric
+from sqlalchemy import Column, DateTime, Numeric, Index, DDL, event, func
 
 class MovementType(str, Enum):
     """出入庫類型枚舉：IN 表示入庫，OUT 表示出庫。"""
@@ -18,15 +18,31 @@ class MovementType(str, Enum):
 class Product(SQLModel, table=True):
     """產品模型：代表倉儲中的商品資訊。"""
     __tablename__ = "product"  # 資料庫表格名稱
+    __table_args__ = (
+        Index(
+            "ix_product_name_trgm", "name",
+            postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),  # 名稱模糊查詢 (ILIKE '%x%')：PostgreSQL 使用 pg_trgm GIN 索引
+    )
+    __mapper_args__ = {"eager_defaults": True}  # 以 RETURNING 取回資料庫產生的欄位值 (如 updated_at)，避免提交後另行查詢
 
     id: Optional[int] = Field(default=None, primary_key=True)  # 產品 ID，主鍵，自動生成
     name: str = Field(index=True, max_length=100)  # 產品名稱，支援索引，最大長度 100
     description: Optional[str] = Field(None, max_length=500)  # 產品描述，可選，最大長度 500
     sku: str = Field(unique=True, index=True, max_length=50)  # SKU 編碼，唯一且支援索引，最大長度 50
     price: Decimal = Field(sa_column=Numeric(precision=10, scale=2), gt=0)  # 產品價格，使用 Decimal 確保精度，大於 0
-
-    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)  # 建立時間，預設為當前 UTC 時間，不可為空
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)  # 更新時間，預設為當前 UTC 時間，不可為空
+    current_stock: int = Field(
+        default=0, sa_column_kwargs={"server_default": "0"}
+    )  # 所有位置的總庫存量 (反正規化欄位)，由入庫/出庫在同一事務中維護，讀取時無需加總 WarehouseItem
+    # 刻意不建立索引：低庫存篩選比較的是每個商品的安全庫存總和，無法使用此欄位的索引；
+    # 且此欄位在每次出入庫時更新，不加索引才能讓 PostgreSQL 使用 HOT 更新
+
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )  # 建立時間，由資料庫於新增時設定 (與 updated_at 同為帶時區的資料庫時間)，不可為空
+    updated_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    )  # 更新時間，由資料庫於新增與每次更新時自動設定，不可為空
 
     warehouse_items: List["WarehouseItem"] = Relationship(
         back_populates="product",
@@ -41,17 +57,33 @@ class Product(SQLModel, table=True):
 class WarehouseItem(SQLModel, table=True):
     """庫存項目模型：代表產品在特定位置的庫存資訊。"""
     __tablename__ = "warehouse_item"  # 資料庫表格名稱
+    __table_args__ = (
+        Index("ix_wi_product_location", "product_id", "location", unique=True),  # 入庫查詢：同一產品在同一位置僅有一筆庫存
+        Index("ix_wi_product_qty", "product_id", "quantity"),  # 出庫查詢：依產品篩選有庫存的項目
+        Index(
+            "ix_wi_location_trgm", "location",
+            postgresql_using="gin", postgresql_ops={"location": "gin_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),  # 位置模糊查詢 (ILIKE '%x%')：PostgreSQL 使用 pg_trgm GIN 索引
+    )
+    __mapper_args__ = {"eager_defaults": True}  # 同 Product
 
     id: Optional[int] = Field(default=None, primary_key=True)  # 庫存項目 ID，主鍵，自動生成
-    product_id: int = Field(foreign_key="product.id", index=True)  # 產品 ID，外鍵，支援索引
+    product_id: int = Field(foreign_key="product.id")  # 產品 ID，外鍵 (由 ix_wi_product_location、ix_wi_product_qty 複合索引涵蓋)
     quantity: int = Field(ge=0)  # 庫存數量，大於或等於 0
     location: str = Field(index=True, max_length=100)  # 存放位置，支援索引，最大長度 100
     safety_stock: int = Field(default=5, ge=0)  # 安全庫存量，預設 5，大於或等於 0
 
-    created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)  # 建立時間，預設為當前 UTC 時間，不可為空
-    updated_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)  # 更新時間，預設為當前 UTC 時間，不可為空
+    created_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )  # 建立時間，由資料庫於新增時設定 (與 updated_at 同為帶時區的資料庫時間)，不可為空
+    updated_at: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    )  # 更新時間，由資料庫於新增與每次更新時自動設定，不可為空
 
-    product: Product = Relationship(back_populates="warehouse_items")  # 關聯的產品：多對一關係
+    product: Product = Relationship(
+        back_populates="warehouse_items",
+        sa_relationship_kwargs={"lazy": "selectin"}
+    )  # 關聯的產品：多對一關係，以 selectin 預先載入，列表查詢僅需一次額外的 IN 查詢，避免 N+1
 
     movements: List["Movement"] = Relationship(
         back_populates="warehouse_item",
@@ -61,15 +93,30 @@ class WarehouseItem(SQLModel, table=True):
 class Movement(SQLModel, table=True):
     """出入庫記錄模型：記錄產品的出入庫操作歷史。"""
     __tablename__ = "movement"  # 資料庫表格名稱
+    __table_args__ = (
+        Index("ix_mov_product_date", "product_id", "movement_date"),  # 依產品查詢 (近期) 出入庫記錄，亦涵蓋僅依 product_id 的篩選
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)  # 記錄 ID，主鍵，自動生成
-    product_id: int = Field(foreign_key="product.id", index=True)  # 產品 ID，外鍵，支援索引
+    product_id: int = Field(foreign_key="product.id")  # 產品 ID，外鍵 (由 ix_mov_product_date 複合索引涵蓋)
     warehouse_item_id: int = Field(foreign_key="warehouse_item.id", index=True, nullable=True)  # 庫存項目 ID，外鍵，可選，支援索引
     movement_type: MovementType = Field(index=True)  # 出入庫類型，支援索引
     quantity: int = Field(gt=0)  # 操作數量，大於 0
-    movement_date: datetime = Field(default_factory=datetime.utcnow, nullable=False)  # 操作日期，預設為當前 UTC 時間，不可為空
+    movement_date: datetime = Field(
+        sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    )  # 操作日期，由資料庫於新增時設定，不可為空
     remarks: Optional[str] = Field(None, max_length=500)  # 備註，可選，最大長度 500
 
-    product: Product = Relationship(back_populates="movements")  # 關聯的產品：多對一關係
+    product: Product = Relationship(
+        back_populates="movements",
+        sa_relationship_kwargs={"lazy": "selectin"}
+    )  # 關聯的產品：多對一關係，以 selectin 預先載入，避免 N+1
+
+    warehouse_item: Optional[WarehouseItem] = Relationship(back_populates="movements")  # 關聯的庫存項目：多對一關係，可選
 
-    warehouse_item: Optional[WarehouseItem] = Relationship(back_populates="movements")  # 關聯的庫存項目：多對一關係，可選
\ No newline at end of file
+# PostgreSQL 的 trigram 索引需要 pg_trgm 擴充套件，建立表格前先確保已啟用
+event.listen(
+    SQLModel.metadata,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"),
+)
@@ -1,10 +1,17 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field, conint
+from typing import Annotated, Optional, List
+from pydantic import AfterValidator, BaseModel, RootModel, ConfigDict, Field, conint, field_serializer, field_validator
 from decimal import Decimal
 
 from app.models import MovementType
 
+def _normalize_sku(sku: Optional[str]) -> Optional[str]:
+    """SKU 一律以大寫儲存與比對。"""
+    return sku.upper() if sku is not None else sku
+
+# 查詢參數用的 SKU 型別：FastAPI 解析參數時即轉為大寫
+SkuQuery = Annotated[Optional[str], AfterValidator(_normalize_sku)]
+
 class LocationQuantity(BaseModel):
     location: str
     quantity: int
@@ -15,6 +22,11 @@ class ProductBase(BaseModel):
     sku: str = Field(min_length=3, max_length=50)
     price: Decimal = Field(gt=0, description="商品價格必須大於0")
 
+    @field_validator("sku")
+    @classmethod
+    def normalize_sku(cls, sku: str) -> str:
+        return _normalize_sku(sku)
+
 class ProductCreate(ProductBase):
     pass
 
@@ -24,13 +36,22 @@ class ProductUpdate(BaseModel):
     sku: Optional[str] = Field(None, min_length=3, max_length=50)
     price: Optional[Decimal] = Field(None, gt=0, description="商品價格必須大於0")
 
+    @field_validator("sku")
+    @classmethod
+    def normalize_sku(cls, sku: Optional[str]) -> Optional[str]:
+        return _normalize_sku(sku)
+
 class ProductRead(ProductBase):
     id: int
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_serializer("price", when_used="json")
+    def serialize_price(self, price: Decimal) -> float:
+        """JSON 回應中以數字輸出價格 (Decimal 預設會序列化為字串)。"""
+        return float(price)
 
 class WarehouseItemBase(BaseModel):
     product_id: int
@@ -46,14 +67,15 @@ class WarehouseItemUpdate(BaseModel):
     location: Optional[str] = Field(None, min_length=2, max_length=100)
     safety_stock: Optional[conint(ge=0)] = Field(None, description="安全庫存量必須大於或等於0")
 
-class WarehouseItemRead(WarehouseItemBase):
+class WarehouseItemSummaryRead(WarehouseItemBase):
     id: int
     created_at: datetime
     updated_at: datetime
-    product: ProductRead
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class WarehouseItemRead(WarehouseItemSummaryRead):
+    product: ProductRead
 
 class MovementBase(BaseModel):
     product_id: int
@@ -71,8 +93,7 @@ class MovementRead(MovementBase):
     product: ProductRead
     warehouse_item: Optional[WarehouseItemRead] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class StockInRequest(BaseModel):
     product_id: int
@@ -80,6 +101,9 @@ class StockInRequest(BaseModel):
     location: str = Field(min_length=2, max_length=100, description="入庫存放位置")
     remarks: Optional[str] = Field(None, max_length=500)
 
+class BulkStockInRequest(RootModel[List[StockInRequest]]):
+    root: List[StockInRequest] = Field(min_length=1, max_length=1000, description="批次入庫請求，一次最多 1000 筆")
+
 class StockOutRequest(BaseModel):
     product_id: int
     quantity: conint(gt=0) = Field(description="出庫數量必須大於0")
@@ -96,8 +120,7 @@ class LowStockAlert(BaseModel):
         description="各存放位置的庫存細節"
     )
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class InventoryQueryRead(BaseModel):
     product_id: int
@@ -106,5 +129,4 @@ class InventoryQueryRead(BaseModel):
     total_quantity: int
     locations: List[LocationQuantity]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
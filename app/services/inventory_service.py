@@ -1,18 +1,143 @@
-from sqlmodel import Session, select, func
-from typing import List, Optional
-from datetime import datetime
+from sqlmodel import select, func, case, or_, update, insert
+from sqlalchemy import Integer, bindparam, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, List, Optional, Set, Tuple
+from itertools import groupby
+from operator import itemgetter
 from app.models import Product, WarehouseItem, Movement, MovementType
-from app.schemas import WarehouseItemRead, StockInRequest, StockOutRequest, LowStockAlert, InventoryQueryRead, LocationQuantity
+from app.schemas import WarehouseItemRead, StockInRequest, BulkStockInRequest, StockOutRequest, LowStockAlert, InventoryQueryRead, LocationQuantity
 from app.exceptions import ProductNotFoundException, InsufficientStockException
 
-def stock_in(session: Session, item_request: StockInRequest) -> WarehouseItemRead:
+def _dialect_insert(session: AsyncSession):
+    """依資料庫方言選擇支援 ON CONFLICT 的 insert 建構式 (PostgreSQL / SQLite)。"""
+    if session.bind.dialect.name == "sqlite":
+        return sqlite_insert
+    return pg_insert
+
+# ===============================================
+# 預先建立的查詢語句
+# 在模組載入時建立一次，每次請求只需綁定參數，省去重複建構查詢的成本
+# ===============================================
+
+# 從指定位置出庫：以單一條件式 UPDATE 扣除庫存，WHERE 條件由資料庫保證庫存足夠，
+# 無需先查詢再寫入，也不會因並行出庫而超賣 (UPDATE 的參數名稱不可與欄位名稱相同)
+STOCK_OUT_AT_LOCATION_STMT = update(WarehouseItem).where(
+    WarehouseItem.product_id == bindparam("item_product_id"),
+    WarehouseItem.location == bindparam("item_location"),
+    WarehouseItem.quantity >= bindparam("requested_quantity", type_=Integer)
+).values(
+    quantity=WarehouseItem.quantity - bindparam("requested_quantity", type_=Integer)
+).returning(WarehouseItem).execution_options(synchronize_session=False, populate_existing=True)
+
+# 出庫失敗時用於區分「位置無庫存記錄」與「庫存不足」
+ITEM_AT_LOCATION_EXISTS_STMT = select(exists().where(
+    WarehouseItem.product_id == bindparam("item_product_id"),
+    WarehouseItem.location == bindparam("item_location")
+))
+
+# 多位置出庫的扣除計畫：
+# 以視窗函數計算累計庫存，由資料庫算出每個位置需扣除的數量，只取回實際需要扣除的項目
+_ordered_items = select(
+    WarehouseItem.id,
+    WarehouseItem.quantity,
+    func.sum(WarehouseItem.quantity).over(order_by=WarehouseItem.id).label("cumulative"), # 累計庫存 (含本項目)
+    func.sum(WarehouseItem.quantity).over().label("total_available"), # 總可用庫存
+).where(
+    WarehouseItem.product_id == bindparam("product_id"),
+    WarehouseItem.quantity > 0 # 只考慮有庫存的項目
+).cte("ordered_items")
+
+_requested_quantity = bindparam("quantity", type_=Integer) # 出庫數量
+_deducted_before = _ordered_items.c.cumulative - _ordered_items.c.quantity # 前面項目已扣除的數量
+
+DEDUCTION_PLAN_STMT = select(
+    _ordered_items.c.id,
+    case(
+        (_ordered_items.c.cumulative <= _requested_quantity, _ordered_items.c.quantity),
+        else_=_requested_quantity - _deducted_before,
+    ).label("deduct_amount"), # 取當前庫存和剩餘待扣除數量中較小者
+    _ordered_items.c.total_available,
+).where(
+    _deducted_before < _requested_quantity,
+    # 總庫存不足時僅取回第一列 (用於判斷總可用庫存)，不傳回其餘項目
+    or_(
+        _ordered_items.c.total_available >= _requested_quantity,
+        _deducted_before == 0
+    )
+).order_by(_ordered_items.c.id)
+
+# 庫存概覽：查詢指定商品的分位置庫存細節
+LOCATION_DETAILS_STMT = select(WarehouseItem.product_id, WarehouseItem.location, WarehouseItem.quantity).where(
+    WarehouseItem.product_id.in_(bindparam("product_ids", expanding=True))
+).order_by(WarehouseItem.product_id, WarehouseItem.id)
+
+# 低庫存警報
+# 以 CTE 按 product_id 分組計算每個商品的總安全庫存量 (總庫存量直接讀取 Product.current_stock)
+_low_stock_totals = select(
+    WarehouseItem.product_id,
+    func.sum(WarehouseItem.safety_stock).label("total_safety_stock") # 計算總安全庫存量
+).group_by(WarehouseItem.product_id).cte("low_stock_totals")
+
+# 將 CTE 與 Product、WarehouseItem 聯接，篩選出總庫存量小於總安全庫存量的商品，
+# 一次取得商品資訊與分位置庫存詳情，避免對每個低庫存商品再各自查詢一次 (N+1 查詢)
+LOW_STOCK_ALERTS_STMT = select(
+    Product.id,
+    Product.name,
+    Product.sku,
+    Product.current_stock,
+    _low_stock_totals.c.total_safety_stock,
+    WarehouseItem.location,
+    WarehouseItem.quantity,
+).join(
+    _low_stock_totals,
+    (_low_stock_totals.c.product_id == Product.id) & (Product.current_stock < _low_stock_totals.c.total_safety_stock)
+).join(
+    WarehouseItem, WarehouseItem.product_id == Product.id
+).order_by(Product.id, WarehouseItem.id) # 依商品排序，讓同一商品的列相鄰以便分組
+
+async def adjust_current_stock(session: AsyncSession, deltas: Dict[int, int]) -> Set[int]:
+    """
+    以單一 UPDATE 調整商品的總庫存量 (Product.current_stock，反正規化欄位)，須在異動庫存項目的同一事務中呼叫。
+
+    Args:
+        session: 資料庫 AsyncSession 物件。
+        deltas: 商品ID 對應的庫存增減量。
+
+    Returns:
+        Set[int]: 實際被調整的商品ID (不存在的商品不會出現在結果中，可兼作存在性檢查)。
+    """
+    result = await session.exec(
+        update(Product).where(Product.id.in_(deltas)).values(
+            current_stock=Product.current_stock + case(deltas, value=Product.id),
+            updated_at=Product.updated_at, # 保留原值：庫存異動不視為商品資料的修改，不觸發 onupdate
+        ).returning(Product.id).execution_options(synchronize_session=False)
+    )
+    return set(result.scalars().all())
+
+def _stock_in_upsert(session: AsyncSession):
+    """
+    建立入庫用的 INSERT ... ON CONFLICT DO UPDATE 語句：(product_id, location) 已存在時累加其數量。
+    RETURNING 依參數順序帶回寫入後的庫存項目，批次入庫時可與請求一一對應。
+    """
+    upsert = _dialect_insert(session)(WarehouseItem)
+    return upsert.on_conflict_do_update(
+        index_elements=["product_id", "location"],
+        set_=dict(
+            quantity=WarehouseItem.__table__.c.quantity + upsert.excluded.quantity, # 已存在則增加其數量
+            updated_at=func.now(), # 更新修改時間 (ON CONFLICT 的 SET 不會套用欄位的 onupdate)
+        ),
+    ).returning(WarehouseItem, sort_by_parameter_order=True).execution_options(populate_existing=True)
+
+async def stock_in(session: AsyncSession, item_request: StockInRequest) -> WarehouseItemRead:
     """
     處理商品的入庫操作。
-    如果指定位置已有該商品的庫存，則更新其數量；否則，創建新的庫存項目。
+    如果指定位置已有該商品的庫存，則更新其數量；否則，創建新的庫存項目 (以 INSERT ... ON CONFLICT 一次完成)。
     同時會記錄一筆入庫移動記錄。
 
     Args:
-        session: 資料庫 Session 物件。
+        session: 資料庫 AsyncSession 物件。
         item_request: 包含入庫商品ID、數量、位置和備註的請求資料。
 
     Returns:
@@ -22,42 +147,27 @@ def stock_in(session: Session, item_request: StockInRequest) -> WarehouseItemRea
         ProductNotFoundException: 如果商品ID不存在。
     """
     # 使用事務 (transaction) 確保操作的原子性：所有操作要嘛全部成功，要嘛全部失敗回滾。
-    with session.begin():
-        # 1. 檢查商品是否存在
-        product = session.get(Product, item_request.product_id)
-        if not product:
+    async with session.begin():
+        # 1. 增加商品的總庫存量，同時檢查商品是否存在
+        if not await adjust_current_stock(session, {item_request.product_id: item_request.quantity}):
             # 如果商品不存在，則拋出商品未找到的例外
             raise ProductNotFoundException()
 
-        # 2. 檢查指定位置是否已有該商品的庫存項目
-        existing_item = session.exec(
-            select(WarehouseItem).where(
-                WarehouseItem.product_id == item_request.product_id,
-                WarehouseItem.location == item_request.location
-            )
-        ).first()
-
-        # 3. 處理庫存更新或創建
-        if existing_item:
-            # 如果存在現有庫存項目，則增加其數量
-            existing_item.quantity += item_request.quantity
-            existing_item.updated_at = datetime.utcnow() # 更新修改時間
-            session.add(existing_item) # 將修改後的項目加入 session
-            db_item = existing_item # 將現有項目設為操作結果
-        else:
-            # 如果沒有現有庫存項目，則創建一個新的
-            item_dict = {
-                'product_id': item_request.product_id,
-                'quantity': item_request.quantity,
-                'location': item_request.location,
+        # 2. 以單一 UPSERT 新增或累加庫存項目：依 (product_id, location) 唯一索引判斷是否已存在，
+        # 避免先查詢再寫入所需的兩次往返，以及並行入庫時重複建立項目的競爭條件
+        # RETURNING 直接帶回寫入後的欄位值，無需在提交後再次查詢 (關聯的 product 由 selectin 策略一併載入)
+        db_item = (await session.exec(
+            _stock_in_upsert(session),
+            params={
+                "product_id": item_request.product_id,
+                "quantity": item_request.quantity,
+                "location": item_request.location,
             }
-            db_item = WarehouseItem(**item_dict) # 建立新的 WarehouseItem 物件
-            session.add(db_item) # 將新項目加入 session
-            session.flush() # 立即將新項目寫入資料庫，以便獲取其 ID (如果 auto-increment)
+        )).scalar_one()
 
-        # 4. 記錄入庫移動
+        # 3. 記錄入庫移動
         movement = Movement(
-            product_id=db_item.product_id,
+            product_id=item_request.product_id,
             warehouse_item_id=db_item.id, # 關聯到剛剛更新或創建的庫存項目
             movement_type=MovementType.IN, # 移動類型為 "IN" (入庫)
             quantity=item_request.quantity,
@@ -65,12 +175,66 @@ def stock_in(session: Session, item_request: StockInRequest) -> WarehouseItemRea
         )
         session.add(movement) # 將移動記錄加入 session
 
-    # 5. 刷新物件狀態並返回
-    # 在事務提交後，刷新 db_item 以確保其關聯物件 (如 product) 能夠正確載入
-    session.refresh(db_item)
+    # 4. 返回更新或創建後的庫存項目
     return db_item
 
-def stock_out(session: Session, stock_out_request: StockOutRequest) -> WarehouseItemRead:
+async def bulk_stock_in(session: AsyncSession, bulk_request: BulkStockInRequest) -> List[WarehouseItemRead]:
+    """
+    批次處理多筆入庫操作，於單一事務中完成。
+    所有庫存項目以一條 UPSERT 語句寫入，所有入庫移動以一條 INSERT 語句寫入，不必為每一筆各付出一次請求與提交的成本。
+
+    Args:
+        session: 資料庫 AsyncSession 物件。
+        bulk_request: 多筆入庫請求資料。
+
+    Returns:
+        List[WarehouseItemRead]: 更新或創建後的庫存項目 (每個商品與位置組合一筆，依請求中首次出現的順序)。
+
+    Raises:
+        ProductNotFoundException: 如果任一商品ID不存在。
+    """
+    item_requests = bulk_request.root
+    async with session.begin():
+        # 1. 以單一 UPDATE 增加所有商品的總庫存量，同時檢查所有商品是否存在
+        stock_deltas: Dict[int, int] = {}
+        for item_request in item_requests:
+            stock_deltas[item_request.product_id] = stock_deltas.get(item_request.product_id, 0) + item_request.quantity
+        missing_ids = stock_deltas.keys() - await adjust_current_stock(session, stock_deltas)
+        if missing_ids:
+            raise ProductNotFoundException(detail=f"商品不存在：{sorted(missing_ids)}")
+
+        # 2. 合併相同商品與位置的入庫數量 (同一條 UPSERT 語句不能更新同一列兩次)
+        quantities: Dict[Tuple[int, str], int] = {}
+        for item_request in item_requests:
+            key = (item_request.product_id, item_request.location)
+            quantities[key] = quantities.get(key, 0) + item_request.quantity
+
+        # 3. 以單一 UPSERT 批次新增或累加所有庫存項目
+        db_items = (await session.exec(
+            _stock_in_upsert(session),
+            params=[
+                {"product_id": product_id, "location": location, "quantity": quantity}
+                for (product_id, location), quantity in quantities.items()
+            ]
+        )).scalars().all()
+        item_ids = {(item.product_id, item.location): item.id for item in db_items}
+
+        # 4. 以單一 INSERT 批次寫入每筆請求的入庫移動
+        await session.exec(insert(Movement), params=[
+            {
+                "product_id": item_request.product_id,
+                "warehouse_item_id": item_ids[(item_request.product_id, item_request.location)],
+                "movement_type": MovementType.IN,
+                "quantity": item_request.quantity,
+                "remarks": item_request.remarks,
+            }
+            for item_request in item_requests
+        ])
+
+    # 5. 返回更新或創建後的庫存項目
+    return list(db_items)
+
+async def stock_out(session: AsyncSession, stock_out_request: StockOutRequest) -> WarehouseItemRead:
     """
     處理商品的彈性出庫操作。
     如果指定了出庫位置，則僅從該位置扣除庫存。
@@ -78,7 +242,7 @@ def stock_out(session: Session, stock_out_request: StockOutRequest) -> Warehouse
     同時會記錄一筆出庫移動記錄。
 
     Args:
-        session: 資料庫 Session 物件。
+        session: 資料庫 AsyncSession 物件。
         stock_out_request: 包含出庫商品ID、數量、可選位置和備註的請求資料。
 
     Returns:
@@ -89,97 +253,89 @@ def stock_out(session: Session, stock_out_request: StockOutRequest) -> Warehouse
         InsufficientStockException: 如果指定位置或總庫存不足以出庫。
     """
     # 使用事務 (transaction) 確保操作的原子性
-    with session.begin():
-        # 1. 檢查商品是否存在
-        product = session.get(Product, stock_out_request.product_id)
-        if not product:
+    async with session.begin():
+        # 1. 扣除商品的總庫存量，同時檢查商品是否存在 (後續出庫失敗時整個事務回滾)
+        if not await adjust_current_stock(session, {stock_out_request.product_id: -stock_out_request.quantity}):
             raise ProductNotFoundException()
 
         updated_items = [] # 用於存放所有被更新的庫存項目
-        
+        movement_rows: List[dict] = [] # 用於存放待寫入的出庫移動記錄
+
         # 2. 判斷是否指定了具體出庫位置
         if stock_out_request.location:
-            # 從指定位置出庫
-            item_to_update = session.exec(
-                select(WarehouseItem).where(
-                    WarehouseItem.product_id == stock_out_request.product_id,
-                    WarehouseItem.location == stock_out_request.location
-                )
-            ).first()
-
-            if not item_to_update:
-                raise ProductNotFoundException(detail=f"商品在位置 '{stock_out_request.location}' 無庫存記錄。")
-
-            if item_to_update.quantity < stock_out_request.quantity:
+            # 從指定位置出庫 (updated_at 由資料庫自動更新)；RETURNING 直接帶回扣除後的項目
+            location_params = {"item_product_id": stock_out_request.product_id, "item_location": stock_out_request.location}
+            item_to_update = (await session.exec(
+                STOCK_OUT_AT_LOCATION_STMT,
+                params={**location_params, "requested_quantity": stock_out_request.quantity}
+            )).scalar_one_or_none()
+
+            if item_to_update is None:
+                # 沒有列被更新：確認是無庫存記錄還是庫存不足
+                if not await session.scalar(ITEM_AT_LOCATION_EXISTS_STMT, params=location_params):
+                    raise ProductNotFoundException(detail=f"商品在位置 '{stock_out_request.location}' 無庫存記錄。")
                 raise InsufficientStockException(detail=f"位置 '{stock_out_request.location}' 的庫存不足。")
 
-            # 扣除庫存並更新時間
-            item_to_update.quantity -= stock_out_request.quantity
-            item_to_update.updated_at = datetime.utcnow()
-            session.add(item_to_update)
             updated_items.append(item_to_update) # 記錄被更新的項目
 
             # 記錄出庫移動
-            movement = Movement(
-                product_id=stock_out_request.product_id,
-                warehouse_item_id=item_to_update.id,
-                movement_type=MovementType.OUT, # 移動類型為 "OUT" (出庫)
-                quantity=stock_out_request.quantity,
-                remarks=stock_out_request.remarks,
-            )
-            session.add(movement)
+            movement_rows.append({
+                "product_id": stock_out_request.product_id,
+                "warehouse_item_id": item_to_update.id,
+                "movement_type": MovementType.OUT, # 移動類型為 "OUT" (出庫)
+                "quantity": stock_out_request.quantity,
+                "remarks": stock_out_request.remarks,
+            })
         else:
             # 從所有可用位置出庫 (未指定位置時)
             # 依 ID 排序，確保出庫順序的一致性 (例如：先進先出 FIFO 的簡化版，或從最老庫存開始扣除)
-            available_items = session.exec(
-                select(WarehouseItem).where(
-                    WarehouseItem.product_id == stock_out_request.product_id,
-                    WarehouseItem.quantity > 0 # 只考慮有庫存的項目
-                ).order_by(WarehouseItem.id) # 依庫存項目 ID 升序排列
-            ).all()
-
-            if not available_items:
+            deduction_plan = (await session.exec(
+                DEDUCTION_PLAN_STMT,
+                params={"product_id": stock_out_request.product_id, "quantity": stock_out_request.quantity}
+            )).all()
+
+            if not deduction_plan:
                 raise ProductNotFoundException(detail="該商品所有位置均無庫存。")
 
-            # 計算總可用庫存
-            total_available = sum(item.quantity for item in available_items)
-            if total_available < stock_out_request.quantity:
+            if deduction_plan[0].total_available < stock_out_request.quantity:
                 raise InsufficientStockException(detail=f"總庫存不足。")
 
-            remaining_to_deduct = stock_out_request.quantity # 剩餘待扣除的數量
-            for item in available_items:
-                if remaining_to_deduct == 0:
-                    break # 如果已經扣除足夠數量，則停止
-                
-                # 計算本次從該位置扣除的數量 (取當前庫存和剩餘待扣除數量中較小者)
-                deduct_amount = min(item.quantity, remaining_to_deduct)
-                item.quantity -= deduct_amount
-                item.updated_at = datetime.utcnow()
-                session.add(item)
-                updated_items.append(item) # 記錄被更新的項目
-                remaining_to_deduct -= deduct_amount # 更新剩餘待扣除數量
-
-                # 記錄本次移動的出庫記錄
-                movement = Movement(
-                    product_id=stock_out_request.product_id,
-                    warehouse_item_id=item.id,
-                    movement_type=MovementType.OUT,
-                    quantity=deduct_amount,
-                    remarks=stock_out_request.remarks,
-                )
-                session.add(movement)
-
-        # 3. 返回結果
-        # 如果有任何項目被更新，返回第一個被更新的項目；否則返回 None (理論上不會發生，因為前面有例外處理)
-        db_item = updated_items[0] if updated_items else None
-
-    # 4. 刷新物件狀態並返回
-    if db_item:
-        session.refresh(db_item)
-    return db_item
+            # 以單一 UPDATE 扣除所有項目的庫存；WHERE 條件確保庫存在查詢後未被其他操作扣減
+            deductions = {item_id: deduct_amount for item_id, deduct_amount, _ in deduction_plan}
+            deduct_amount = case(deductions, value=WarehouseItem.id)
+            # RETURNING 直接帶回扣除後的項目，無需在提交後再次查詢
+            deducted_items = (await session.exec(
+                update(WarehouseItem).where(
+                    WarehouseItem.id.in_(deductions),
+                    WarehouseItem.quantity >= deduct_amount
+                ).values(
+                    quantity=WarehouseItem.quantity - deduct_amount
+                ).returning(WarehouseItem).execution_options(synchronize_session=False, populate_existing=True)
+            )).scalars().all()
+            if len(deducted_items) != len(deductions):
+                raise InsufficientStockException(detail="庫存已被其他操作變更，請重試。")
+            updated_items.extend(sorted(deducted_items, key=lambda item: item.id)) # 記錄被更新的項目 (依 ID 排序)
+
+            # 記錄每個被扣除位置的出庫移動
+            movement_rows.extend(
+                {
+                    "product_id": stock_out_request.product_id,
+                    "warehouse_item_id": item_id,
+                    "movement_type": MovementType.OUT,
+                    "quantity": amount,
+                    "remarks": stock_out_request.remarks,
+                }
+                for item_id, amount in deductions.items()
+            )
+
+        # 3. 以單一 INSERT 批次寫入所有出庫移動，略過逐筆物件的 unit-of-work 處理
+        await session.exec(insert(Movement), params=movement_rows)
 
-def get_inventory_overview(
-    session: Session,
+    # 4. 返回結果：第一個被更新的項目
+    return updated_items[0]
+
+async def get_inventory_overview(
+    session: AsyncSession,
     offset: int = 0,
     limit: int = 100,
     product_name: Optional[str] = None,
@@ -189,94 +345,84 @@ def get_inventory_overview(
     獲取庫存概覽，匯總每個商品的總庫存和分位置庫存。
 
     Args:
-        session: 資料庫 Session 物件。
+        session: 資料庫 AsyncSession 物件。
         offset: 分頁查詢的偏移量。
         limit: 分頁查詢的限制數量。
         product_name: 可選的商品名稱篩選條件 (模糊匹配)。
-        sku: 可選的商品 SKU 篩選條件 (精確匹配)。
+        sku: 可選的商品 SKU 篩選條件 (精確匹配，須為大寫)。
 
     Returns:
         List[InventoryQueryRead]: 包含每個商品庫存概覽的列表。
     """
-    # 1. 構建查詢：聯接 WarehouseItem 和 Product 表
-    query = select(WarehouseItem, Product).join(Product)
+    # 1. 構建查詢：總庫存量直接讀取 Product.current_stock，無需聯接 WarehouseItem 分組加總；
+    # 只列出有庫存項目的商品
+    query = select(
+        Product.id,
+        Product.name,
+        Product.sku,
+        Product.current_stock,
+    ).where(Product.warehouse_items.any())
 
     # 2. 應用篩選條件
     if product_name:
         query = query.where(Product.name.ilike(f"%{product_name}%")) # 模糊匹配商品名稱 (不區分大小寫)
     if sku:
-        query = query.where(Product.sku == sku.upper()) # 精確匹配 SKU (轉換為大寫)
-
-    # 3. 執行查詢獲取所有相關庫存項目及其商品資訊
-    results = session.exec(query).all()
-
-    # 4. 處理查詢結果，將數據按商品 ID 進行匯總
-    inventory_map = {} # 用於暫存和匯總數據，key 為 product.id
-    for item, product in results:
-        if product.id not in inventory_map:
-            # 如果是該商品第一次出現，則初始化其概覽資訊
-            inventory_map[product.id] = {
-                "product_id": product.id,
-                "product_name": product.name,
-                "sku": product.sku,
-                "total_quantity": 0, # 初始化總數量
-                "locations": [] # 初始化分位置庫存列表
-            }
-        # 累加總數量
-        inventory_map[product.id]["total_quantity"] += item.quantity
-        # 記錄該商品在特定位置的庫存細節
-        inventory_map[product.id]["locations"].append(LocationQuantity(location=item.location, quantity=item.quantity))
-
-    # 5. 將匯總後的數據轉換為列表，並應用分頁
-    overview_list = list(inventory_map.values())[offset : offset + limit]
-
-    return overview_list
+        query = query.where(Product.sku == sku) # 精確匹配 SKU (呼叫端已轉換為大寫)
+
+    # 3. 在資料庫中分頁，只取回當頁的商品資訊
+    query = query.order_by(Product.id).offset(offset).limit(limit)
+    products = (await session.exec(query)).all()
+    if not products:
+        return []
+
+    # 4. 僅查詢當頁商品的分位置庫存細節
+    location_rows = (await session.exec(
+        LOCATION_DETAILS_STMT, params={"product_ids": [product_id for product_id, *_ in products]}
+    )).all()
+
+    locations_map = {} # 用於暫存分位置庫存，key 為 product_id
+    for product_id, location, quantity in location_rows:
+        locations_map.setdefault(product_id, []).append(LocationQuantity(location=location, quantity=quantity))
+
+    # 5. 組合兩次查詢的結果
+    return [
+        InventoryQueryRead(
+            product_id=product_id,
+            product_name=name,
+            sku=product_sku,
+            total_quantity=total_quantity,
+            locations=locations_map.get(product_id, []),
+        )
+        for product_id, name, product_sku, total_quantity in products
+    ]
 
-def get_low_stock_alerts(session: Session) -> List[LowStockAlert]:
+async def get_low_stock_alerts(session: AsyncSession) -> List[LowStockAlert]:
     """
     獲取所有低於安全庫存閾值的商品警報。
     一個商品被視為低庫存，如果其所有位置的總庫存量低於其所有位置的安全庫存總和。
 
     Args:
-        session: 資料庫 Session 物件。
+        session: 資料庫 AsyncSession 物件。
 
     Returns:
         List[LowStockAlert]: 包含所有低庫存警報的列表。
     """
-    # 1. 查詢總庫存量低於總安全庫存量的商品
-    # 這裡聯接 Product 和 WarehouseItem 表，按 Product ID 分組，
-    # 計算每個商品的總庫存量和總安全庫存量，
-    # 然後篩選出總庫存量小於總安全庫存量的商品。
-    query = select(
-        Product.id,
-        Product.name,
-        Product.sku,
-        func.sum(WarehouseItem.quantity).label("total_quantity"), # 計算總庫存量
-        func.sum(WarehouseItem.safety_stock).label("total_safety_stock") # 計算總安全庫存量
-    ).join(WarehouseItem).group_by(Product.id).having( # 按 Product ID 分組，然後應用 HAVING 條件
-        func.sum(WarehouseItem.quantity) < func.sum(WarehouseItem.safety_stock)
-    )
-
-    low_stock_products = session.exec(query).all() # 執行查詢
+    # 1. 執行預先建立的低庫存查詢 (見 LOW_STOCK_ALERTS_STMT)，一次取得商品資訊與分位置庫存詳情
+    rows = (await session.exec(LOW_STOCK_ALERTS_STMT)).all() # 執行查詢
 
+    # 2. 依商品 ID 分組，將結果轉換為 LowStockAlert 對象
     alerts = [] # 用於存放低庫存警報
-    for product_id, product_name, sku, current_stock, safety_stock in low_stock_products:
-        # 對於每個低庫存商品，進一步查詢其分位置庫存詳情
-        location_items = session.exec(
-            select(WarehouseItem.location, WarehouseItem.quantity).where(
-                WarehouseItem.product_id == product_id
-            )
-        ).all()
-        # 將查詢結果轉換為 LocationQuantity 對象列表
-        location_details = [LocationQuantity(location=loc, quantity=qty) for loc, qty in location_items]
-
-        # 創建 LowStockAlert 對象並加入警報列表
+    for product_id, product_rows in groupby(rows, key=itemgetter(0)):
+        product_rows = list(product_rows)
+        _, product_name, sku, current_stock, safety_stock, _, _ = product_rows[0]
         alerts.append(LowStockAlert(
             product_id=product_id,
             product_name=product_name,
             sku=sku,
             current_stock=current_stock,
             safety_stock=safety_stock,
-            location_details=location_details # 包含分位置庫存詳情
+            location_details=[
+                LocationQuantity(location=loc, quantity=qty) for *_, loc, qty in product_rows
+            ] # 包含分位置庫存詳情
         ))
-    return alerts # 返回低庫存警報列表
\ No newline at end of file
+    return alerts # 返回低庫存警報列表
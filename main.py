@@ -1,16 +1,18 @@
 # main.py：FastAPI 應用程式的主要入口檔案
 
-from fastapi import FastAPI, Depends, HTTPException, status, Request
-from dotenv import load_dotenv
-import os
+from fastapi import FastAPI, Depends, status, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+import logging
 from typing import List
+from contextlib import asynccontextmanager
 from datetime import datetime
 
-# 載入 .env 檔案中的環境變數
-load_dotenv()
+# 匯入應用程式設定 (非生產環境會在此載入 .env)
+from app.config import Settings, get_settings
 
 # 匯入資料庫相關工具和模型
-from app.database import create_db_and_tables, get_session
+from app.database import create_db_and_tables, engine, get_session, redis_client
 from app.models import Product, WarehouseItem, Movement, MovementType # 匯入所有模型
 from app.schemas import (
     ProductCreate, ProductRead, ProductUpdate,
@@ -24,55 +26,78 @@ from sqlmodel import Session, select # 匯入 Session 和 select 進行資料庫
 # 匯入並註冊 API 路由
 from app.api.v1.endpoints import products, warehouse_items #, inventory # 暫時註解 inventory, 等待實作
 
+# 匯入日誌配置
+from app.logging_config import setup_logging
+
+# 匯入中介軟體
+from app.middleware import ETagMiddleware
+
 # 匯入自定義例外
 from app.exceptions import ProductNotFoundException, InsufficientStockException
 
-# 初始化 FastAPI 應用程式實例
-app = FastAPI(
-    title="📦 倉儲物流系統 API",
-    description="一個簡單的 FastAPI 應用程式，用於管理倉儲商品、庫存及出入庫記錄。",
-    version="0.1.0",
-)
+# 應用程式日誌器：記錄經由 QueueHandler 放入佇列，由背景執行緒寫出，不阻塞事件迴圈
+logger = logging.getLogger("warehouse_system_api")
 
 # ===============================================
-# 啟動事件 (Startup Event)
-# 在應用程式啟動時執行，用於初始化資料庫等操作
+# 生命週期 (Lifespan)
+# 應用程式啟動時初始化資料庫等操作，關閉時釋放連線池
 # ===============================================
-@app.on_event("startup")
-def on_startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
-    應用程式啟動時執行的事件處理器。
-    根據環境變數 CREATE_TABLES_ON_STARTUP 決定是否在啟動時創建資料庫表格。
+    應用程式的生命週期處理器。
+    啟動時配置日誌系統，並根據環境變數 CREATE_TABLES_ON_STARTUP 決定是否創建資料庫表格；關閉時釋放資料庫連線池。
     注意：在生產環境中，此功能通常應關閉，並使用 Alembic 進行資料庫遷移管理。
     """
-    print("🚀 應用程式啟動中...")
-    if os.getenv("CREATE_TABLES_ON_STARTUP", "false").lower() == "true":
-        create_db_and_tables() # 呼叫此函式以確保資料庫表格存在 (方便初期開發)
-        print("✅ 資料庫表格檢查或初始化完成 (透過 CREATE_TABLES_ON_STARTUP)。")
+    setup_logging()
+    logger.info("🚀 應用程式啟動中...")
+    if get_settings().create_tables_on_startup:
+        await create_db_and_tables() # 呼叫此函式以確保資料庫表格存在 (方便初期開發)
+        logger.info("✅ 資料庫表格檢查或初始化完成 (透過 CREATE_TABLES_ON_STARTUP)。")
     else:
-        print("ℹ️ 未在啟動時自動創建資料庫表格 (CREATE_TABLES_ON_STARTUP 未設定或為 false)。請確保已執行 Alembic 遷移。")
-    print("✨ 應用程式已成功啟動！")
+        logger.info("ℹ️ 未在啟動時自動創建資料庫表格 (CREATE_TABLES_ON_STARTUP 未設定或為 false)。請確保已執行 Alembic 遷移。")
+    logger.info("✨ 應用程式已成功啟動！")
+    yield
+    await engine.dispose() # 關閉所有連線池中的資料庫連線
+    if redis_client is not None:
+        await redis_client.aclose() # 關閉 Redis 快取的連線池
+
+# 初始化 FastAPI 應用程式實例
+app = FastAPI(
+    title="📦 倉儲物流系統 API",
+    description="一個簡單的 FastAPI 應用程式，用於管理倉儲商品、庫存及出入庫記錄。",
+    version="0.1.0",
+    default_response_class=ORJSONResponse, # 使用 orjson 序列化回應，比標準 json 模組更快
+    lifespan=lifespan,
+)
+
+# GET 回應加上 ETag，重複請求時可返回 304 Not Modified
+app.add_middleware(ETagMiddleware)
+# 壓縮 1KB 以上的回應 (列表端點的 JSON 重複鍵多，壓縮率高)；
+# 最後加入的中介軟體位於最外層，ETag 以未壓縮的內容計算，壓縮則作用於最終回應
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
 # ===============================================
 # 自定義例外處理器
 # ===============================================
 @app.exception_handler(ProductNotFoundException)
 async def product_not_found_exception_handler(request: Request, exc: ProductNotFoundException):
-    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=exc.detail)
+    return ORJSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"detail": exc.detail})
 
 @app.exception_handler(InsufficientStockException)
 async def insufficient_stock_exception_handler(request: Request, exc: InsufficientStockException):
-    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=exc.detail)
+    return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": exc.detail})
 
 # ===============================================
 # 根路由 (Root Route)
 # 測試 API 是否正常運作的基本端點
 # ===============================================
 @app.get("/", tags=["🏠 Root"])
-async def read_root():
+async def read_root(response: Response):
     """
     應用程式的根路徑，提供歡迎訊息和 API 文件連結。
     """
+    response.headers["Cache-Control"] = "public, max-age=60"
     return {"message": "歡迎使用倉儲物流系統 API！", "docs_url": "/docs"}
 
 # ===============================================
@@ -81,22 +106,18 @@ async def read_root():
 # 注意：在生產環境中，建議限制此端點的訪問或移除敏感資訊
 # ===============================================
 @app.get("/config", tags=["⚙️ Configuration"])
-async def get_config():
+async def get_config(response: Response, settings: Settings = Depends(get_settings)):
     """
     獲取應用程式的配置資訊，例如從環境變數讀取的值。
     注意：此端點僅用於開發除錯，請勿在生產環境暴露。
     """
-    example_var = os.getenv("EXAMPLE_VAR", "Not Set")
-    app_secret_key_status = "Set" if os.getenv("APP_SECRET_KEY") else "Not Set"
-    create_tables_on_startup = os.getenv("CREATE_TABLES_ON_STARTUP", "Not Set")
-    sql_echo = os.getenv("SQL_ECHO", "Not Set")
-
+    response.headers["Cache-Control"] = "no-store" # 配置資訊不應被快取
     return {
         "message": "應用程式配置資訊概覽",
-        "env_example_var": example_var,
-        "app_secret_key_status": app_secret_key_status,
-        "create_tables_on_startup": create_tables_on_startup,
-        "sql_echo": sql_echo
+        "env_example_var": settings.example_var,
+        "app_secret_key_status": "Set" if settings.app_secret_key else "Not Set",
+        "create_tables_on_startup": settings.create_tables_on_startup,
+        "sql_echo": settings.sql_echo
     }
 
 # ===============================================
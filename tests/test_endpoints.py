@@ -1,35 +1,121 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import create_engine, SQLModel, Session
-from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine, SQLModel, Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from redis.exceptions import ConnectionError as RedisConnectionError
 
 from app.main import app
+from app.api.v1.endpoints import products as products_endpoint
 from app.database import get_session
 from app.models import Product, WarehouseItem, Movement, MovementType
 
-@pytest.fixture(name="session")
-def session_fixture():
-    """測試用的資料庫 session fixture，使用 in-memory SQLite，避免影響真實資料庫。"""
+@pytest.fixture(name="db_file", scope="session")
+def db_file_fixture(tmp_path_factory):
+    """測試用的 SQLite 檔案路徑：同步 session (準備資料) 與非同步 session (API) 共用同一個資料庫。"""
+    return tmp_path_factory.mktemp("db") / "test.db"
+
+@pytest.fixture(name="engine", scope="session")
+def engine_fixture(db_file):
+    """測試用的同步 engine：整個測試階段共用，資料庫結構只建立一次。"""
     engine = create_engine(
-        "sqlite://",
+        f"sqlite:///{db_file}",
         connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture(name="session")
+def session_fixture(engine):
+    """測試用的資料庫 session fixture，使用暫存 SQLite 檔案，避免影響真實資料庫。"""
     with Session(engine) as session:
         yield session
+    # API 以另一個連線提交資料，無法以交易回滾隔離；測試結束後清空所有表格，讓下一個測試從空資料庫開始
+    with engine.begin() as connection:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            connection.execute(table.delete())
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
-    """測試用的 FastAPI 客戶端 fixture，覆寫 session 依賴以使用測試資料庫。"""
-    def get_session_override():
-        return session
+def client_fixture(session: Session, db_file):
+    """測試用的 FastAPI 客戶端 fixture，覆寫 session 依賴以使用測試資料庫 (aiosqlite)。"""
+    # TestClient 每個請求都在新的事件迴圈中執行，因此不重複使用連線
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_file}", poolclass=NullPool)
+
+    async def get_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as async_session:
+            yield async_session
 
     app.dependency_overrides[get_session] = get_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
 
+class FakeRedis:
+    """測試用的記憶體 Redis：只實作產品快取用到的指令 (get/set/incr 與 pipeline)。"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    """FakeRedis 的 pipeline：execute 時依序執行暫存的指令。"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def delete(self, *keys):
+        self.commands.append(lambda: self.redis.delete(*keys))
+
+    def incr(self, key):
+        self.commands.append(lambda: self.redis.incr(key))
+
+    async def execute(self):
+        for command in self.commands:
+            command()
+
+class BrokenRedis:
+    """模擬無法連線的 Redis：所有指令都拋出 ConnectionError。"""
+
+    async def get(self, key):
+        raise RedisConnectionError("Redis 無法連線")
+
+    async def set(self, key, value, ex=None):
+        raise RedisConnectionError("Redis 無法連線")
+
+    def pipeline(self, transaction=True):
+        raise RedisConnectionError("Redis 無法連線")
+
+@pytest.fixture(name="cache")
+def cache_fixture(monkeypatch):
+    """以記憶體 Redis 取代產品端點的快取客戶端。"""
+    cache = FakeRedis()
+    monkeypatch.setattr(products_endpoint, "redis_client", cache)
+    return cache
+
 def test_create_product(client: TestClient):
     """測試創建產品端點：驗證是否能成功新增產品，並檢查回傳資料和 HTTP 狀態碼。"""
     response = client.post(
@@ -57,6 +143,11 @@ def test_get_product(client: TestClient, session: Session):
     assert data["name"] == "測試產品2"
     assert data["sku"] == "TEST456"
 
+    # 帶回相同的 ETag 時應返回 304 Not Modified
+    etag = response.headers["etag"]
+    response = client.get(f"/api/v1/products/{product.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
 def test_get_product_not_found(client: TestClient):
     """測試獲取不存在產品：驗證回傳 404 錯誤。"""
     response = client.get("/api/v1/products/9999")
@@ -80,6 +171,68 @@ def test_update_product(client: TestClient, session: Session):
     assert data["name"] == "新產品"
     assert data["price"] == 25.0
 
+def test_update_product_changes_etag(client: TestClient, session: Session):
+    """測試更新產品後 ETag 改變：即使在同一秒內更新，舊的 ETag 也不應再得到 304。"""
+    product = Product(name="快取產品", sku="ETAG123", price=15.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+
+    old_etag = client.get(f"/api/v1/products/{product.id}").headers["etag"]
+    client.patch(f"/api/v1/products/{product.id}", json={"price": 30.0})
+
+    response = client.get(f"/api/v1/products/{product.id}", headers={"If-None-Match": old_etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != old_etag
+    assert response.json()["price"] == 30.0
+
+def test_product_cache_hit_and_invalidation(client: TestClient, session: Session, cache: FakeRedis):
+    """測試產品快取：第二次讀取來自快取，PATCH 與 DELETE 之後快取失效。"""
+    product = Product(name="快取產品", sku="CACHE123", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+
+    # 第一次讀取未命中快取，查詢資料庫後寫入快取
+    assert client.get(f"/api/v1/products/{product.id}").json()["price"] == 10.0
+    assert f"product:{product.id}" in cache.data
+
+    # 直接修改資料庫 (不經 API)，第二次讀取命中快取，仍返回舊資料
+    product.price = 99.0
+    session.add(product)
+    session.commit()
+    assert client.get(f"/api/v1/products/{product.id}").json()["price"] == 10.0
+
+    # 經由 API 更新後快取失效，讀取到最新資料
+    client.patch(f"/api/v1/products/{product.id}", json={"price": 20.0})
+    assert client.get(f"/api/v1/products/{product.id}").json()["price"] == 20.0
+
+    # 刪除後快取失效，讀取返回 404 而非快取中的舊資料
+    assert client.delete(f"/api/v1/products/{product.id}").status_code == 204
+    assert client.get(f"/api/v1/products/{product.id}").status_code == 404
+
+def test_product_list_cache_invalidation(client: TestClient, cache: FakeRedis):
+    """測試產品列表快取：新增產品會遞增列表版本號，下一次列表讀取包含新產品。"""
+    client.post("/api/v1/products/", json={"name": "列表產品1", "sku": "LIST1", "price": 1.0})
+    assert len(client.get("/api/v1/products/").json()) == 1
+
+    client.post("/api/v1/products/", json={"name": "列表產品2", "sku": "LIST2", "price": 2.0})
+    assert len(client.get("/api/v1/products/").json()) == 2
+
+def test_product_cache_unavailable(client: TestClient, session: Session, monkeypatch):
+    """測試 Redis 無法連線時：讀取與寫入端點改由資料庫處理，仍正常回應。"""
+    monkeypatch.setattr(products_endpoint, "redis_client", BrokenRedis())
+    product = Product(name="無快取產品", sku="NOCACHE1", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+
+    assert client.get(f"/api/v1/products/{product.id}").json()["price"] == 10.0
+    assert len(client.get("/api/v1/products/").json()) == 1
+    response = client.patch(f"/api/v1/products/{product.id}", json={"price": 20.0})
+    assert response.status_code == 200
+    assert response.json()["price"] == 20.0
+
 def test_stock_in(client: TestClient, session: Session):
     """測試入庫端點：新增庫存項目，驗證數量增加和 Movement 記錄。"""
     # 先新增一個產品
@@ -102,6 +255,40 @@ def test_stock_in(client: TestClient, session: Session):
     assert movement.movement_type == MovementType.IN
     assert movement.quantity == 100
 
+    # 檢查商品的總庫存量已同步更新
+    session.refresh(product)
+    assert product.current_stock == 100
+
+def test_bulk_stock_in(client: TestClient, session: Session):
+    """測試批次入庫：相同商品與位置的請求合併累加，每筆請求各記錄一筆 Movement；任一商品不存在時返回 404 且不寫入。"""
+    product = Product(name="批次產品", sku="BULK123", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+    session.add(WarehouseItem(product_id=product.id, quantity=10, location="A1"))
+    session.commit()
+
+    response = client.post("/api/v1/warehouse-items/bulk", json=[
+        {"product_id": product.id, "quantity": 5, "location": "A1"},
+        {"product_id": product.id, "quantity": 3, "location": "A1"},
+        {"product_id": product.id, "quantity": 7, "location": "B1"},
+    ])
+    data = response.json()
+    assert response.status_code == 201
+    assert [(item["location"], item["quantity"]) for item in data] == [("A1", 18), ("B1", 7)]
+
+    movements = session.exec(select(Movement).where(Movement.product_id == product.id)).all()
+    assert sorted(movement.quantity for movement in movements) == [3, 5, 7]
+
+    # 任一商品不存在時整批回滾
+    response = client.post("/api/v1/warehouse-items/bulk", json=[
+        {"product_id": product.id, "quantity": 1, "location": "A1"},
+        {"product_id": 9999, "quantity": 1, "location": "A1"},
+    ])
+    assert response.status_code == 404
+    assert "9999" in response.json()["detail"]
+    assert len(session.exec(select(Movement).where(Movement.product_id == product.id)).all()) == 3
+
 def test_stock_out_insufficient(client: TestClient, session: Session):
     """測試出庫端點（庫存不足情境）：驗證回傳 400 錯誤。"""
     # 先新增產品和少量庫存
@@ -121,4 +308,186 @@ def test_stock_out_insufficient(client: TestClient, session: Session):
     assert response.status_code == 400
     assert "庫存不足" in response.json()["detail"]  # 假設自定義錯誤訊息
 
-# 可以繼續添加更多測試，如 delete_product、get_low_stock_alerts 等
\ No newline at end of file
+def test_stock_out_at_location(client: TestClient, session: Session):
+    """測試指定位置出庫：成功時只扣減該位置；庫存不足返回 400、位置不存在返回 404，且皆不變更庫存。"""
+    product = Product(name="位置出庫產品", sku="LOC123", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+    client.post("/api/v1/warehouse-items/bulk", json=[
+        {"product_id": product.id, "quantity": 10, "location": "A1"},
+        {"product_id": product.id, "quantity": 10, "location": "B1"},
+    ])
+
+    response = client.post("/api/v1/warehouse-items/stock-out", json={"product_id": product.id, "quantity": 4, "location": "B1"})
+    assert response.status_code == 200
+    assert response.json()["location"] == "B1"
+    assert response.json()["quantity"] == 6
+
+    response = client.post("/api/v1/warehouse-items/stock-out", json={"product_id": product.id, "quantity": 7, "location": "B1"})
+    assert response.status_code == 400
+    assert "B1" in response.json()["detail"]
+
+    response = client.post("/api/v1/warehouse-items/stock-out", json={"product_id": product.id, "quantity": 1, "location": "Z9"})
+    assert response.status_code == 404
+    assert "Z9" in response.json()["detail"]
+
+    session.expire_all()
+    items = session.exec(select(WarehouseItem).where(WarehouseItem.product_id == product.id).order_by(WarehouseItem.location)).all()
+    assert [(item.location, item.quantity) for item in items] == [("A1", 10), ("B1", 6)]
+    assert session.get(Product, product.id).current_stock == 16
+
+def test_stock_out_across_locations(client: TestClient, session: Session):
+    """測試未指定位置出庫：依庫存項目順序分散扣減，前面的項目扣完後才扣下一個。"""
+    product = Product(name="分散出庫產品", sku="MULTI123", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+    client.post("/api/v1/warehouse-items/bulk", json=[
+        {"product_id": product.id, "quantity": 10, "location": "A1"},
+        {"product_id": product.id, "quantity": 10, "location": "B1"},
+        {"product_id": product.id, "quantity": 10, "location": "C1"},
+    ])
+
+    response = client.post("/api/v1/warehouse-items/stock-out", json={"product_id": product.id, "quantity": 15})
+    assert response.status_code == 200
+
+    session.expire_all()
+    items = session.exec(select(WarehouseItem).where(WarehouseItem.product_id == product.id).order_by(WarehouseItem.id)).all()
+    assert [(item.location, item.quantity) for item in items] == [("A1", 0), ("B1", 5), ("C1", 10)]
+    movements = session.exec(select(Movement).where(
+        Movement.product_id == product.id, Movement.movement_type == MovementType.OUT
+    )).all()
+    assert sum(movement.quantity for movement in movements) == 15
+
+def test_get_low_stock_alerts(client: TestClient, session: Session):
+    """測試低庫存警報端點：僅回傳總庫存低於總安全庫存的產品，並包含各位置的庫存細節。"""
+    low_product = Product(name="低庫存產品", sku="LOW123", price=10.0)
+    ok_product = Product(name="充足產品", sku="OK123", price=10.0)
+    session.add(low_product)
+    session.add(ok_product)
+    session.commit()
+
+    # 經由批次入庫建立庫存，current_stock 由 API 維護
+    client.post("/api/v1/warehouse-items/bulk", json=[
+        {"product_id": low_product.id, "quantity": 1, "location": "C1"},
+        {"product_id": low_product.id, "quantity": 2, "location": "C2"},
+        {"product_id": ok_product.id, "quantity": 50, "location": "C1"},
+    ])
+
+    response = client.get("/api/v1/warehouse-items/inventory/low-stock")
+    data = response.json()
+    assert response.status_code == 200
+    assert len(data) == 1
+    assert data[0]["sku"] == "LOW123"
+    assert data[0]["current_stock"] == 3
+    assert data[0]["safety_stock"] == 10
+    assert data[0]["location_details"] == [
+        {"location": "C1", "quantity": 1},
+        {"location": "C2", "quantity": 2},
+    ]
+
+def test_get_warehouse_items_expand(client: TestClient, session: Session):
+    """測試庫存列表的 expand 參數：預設包含關聯產品，傳入 expand= (空值) 時返回不含 product 的精簡格式。"""
+    product = Product(name="列表庫存產品", sku="EXPAND1", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+    session.add(WarehouseItem(product_id=product.id, quantity=10, location="E1"))
+    session.commit()
+
+    data = client.get("/api/v1/warehouse-items/").json()
+    assert data[0]["product"]["sku"] == "EXPAND1"
+
+    response = client.get("/api/v1/warehouse-items/", params={"expand": ""})
+    data = response.json()
+    assert response.status_code == 200
+    assert data[0]["location"] == "E1"
+    assert "product" not in data[0]
+
+    # OpenAPI 文件需同時描述兩種格式
+    schema = client.get("/openapi.json").json()["paths"]["/api/v1/warehouse-items/"]["get"]["responses"]["200"]
+    assert "WarehouseItemSummaryRead" in str(schema)
+
+def test_update_warehouse_item_location_conflict(client: TestClient, session: Session):
+    """測試更新庫存位置：移到同一產品已使用的位置返回 409，移到新位置則成功。"""
+    product = Product(name="移位產品", sku="MOVE123", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+    item = WarehouseItem(product_id=product.id, quantity=5, location="A1")
+    session.add(item)
+    session.add(WarehouseItem(product_id=product.id, quantity=5, location="B1"))
+    session.commit()
+    session.refresh(item)
+
+    response = client.patch(f"/api/v1/warehouse-items/{item.id}", json={"location": "B1"})
+    assert response.status_code == 409
+    assert "B1" in response.json()["detail"]
+
+    response = client.patch(f"/api/v1/warehouse-items/{item.id}", json={"location": "C1"})
+    assert response.status_code == 200
+    assert response.json()["location"] == "C1"
+
+def test_current_stock_stays_in_sync(client: TestClient, session: Session):
+    """測試 current_stock 在批次入庫、指定位置出庫、跨位置出庫與刪除庫存項目後，皆等於各位置庫存量的總和。"""
+    product = Product(name="同步產品", sku="SYNC123", price=10.0)
+    session.add(product)
+    session.commit()
+    session.refresh(product)
+
+    def assert_in_sync(expected: int):
+        session.expire_all()
+        items = session.exec(select(WarehouseItem).where(WarehouseItem.product_id == product.id)).all()
+        assert session.get(Product, product.id).current_stock == expected
+        assert sum(item.quantity for item in items) == expected
+
+    client.post("/api/v1/warehouse-items/bulk", json=[
+        {"product_id": product.id, "quantity": 30, "location": "A1"},
+        {"product_id": product.id, "quantity": 20, "location": "B1"},
+    ])
+    assert_in_sync(50)
+
+    client.post("/api/v1/warehouse-items/stock-out", json={"product_id": product.id, "quantity": 10, "location": "A1"})
+    assert_in_sync(40)
+
+    client.post("/api/v1/warehouse-items/stock-out", json={"product_id": product.id, "quantity": 35})
+    assert_in_sync(5)
+
+    item = session.exec(select(WarehouseItem).where(WarehouseItem.product_id == product.id, WarehouseItem.quantity > 0)).one()
+    assert client.delete(f"/api/v1/warehouse-items/{item.id}").status_code == 204
+    assert_in_sync(0)
+
+# 可以繼續添加更多測試，如 delete_product、get_low_stock_alerts 等
+def test_read_root_etag(client: TestClient):
+    """測試 ETag 中介軟體：回應帶有 ETag，帶回相同 ETag 時返回 304。"""
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+    response = client.get("/", headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+    # If-None-Match 可帶多個 ETag，並以弱比對忽略 W/ 前綴
+    etag = response.headers["etag"]
+    response = client.get("/", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+
+def test_list_endpoint_etag(client: TestClient, session: Session):
+    """測試列表端點的 ETag：內容不變時返回 304，新增產品後舊的 ETag 不再匹配。"""
+    session.add(Product(name="列表產品", sku="LISTETAG1", price=10.0))
+    session.commit()
+
+    etag = client.get("/api/v1/products/").headers["etag"]
+    assert client.get("/api/v1/products/", headers={"If-None-Match": etag}).status_code == 304
+
+    session.add(Product(name="列表產品2", sku="LISTETAG2", price=10.0))
+    session.commit()
+    assert client.get("/api/v1/products/", headers={"If-None-Match": etag}).status_code == 200
+
+def test_config_has_no_etag(client: TestClient):
+    """測試 Cache-Control: no-store 的回應 (/config) 不加上 ETag。"""
+    response = client.get("/config")
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers